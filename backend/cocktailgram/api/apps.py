@@ -5,3 +5,8 @@ class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
     verbose_name = 'Апи'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        from .shopping_cart import register_font
+        register_font()
@@ -0,0 +1,117 @@
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from django.urls import URLPattern
+
+from cocktailgram.metrics import timed_render
+from recipes.models import RecipeIngredient
+from .loaders import load_recipe_tags, recipe_tags_loader
+from .views import RecipeViewSet
+
+# Django 3.2 не умеет асинхронный ORM, поэтому асинхронные обработчики
+# отдают синхронные DRF-представления в собственный пул потоков: event loop
+# остаётся свободным, а запросы выполняются параллельно, а не по одному
+# в общем потоке, как у синхронных представлений под ASGI.
+view_executor = ThreadPoolExecutor(
+    max_workers=settings.ASYNC_VIEW_WORKERS,
+    thread_name_prefix='async-view')
+query_executor = ThreadPoolExecutor(
+    max_workers=settings.ASYNC_QUERY_WORKERS,
+    thread_name_prefix='async-query')
+
+
+def run_query(func, *args, **kwargs):
+    """Запрос в потоке пула с соблюдением CONN_MAX_AGE."""
+    close_old_connections()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+# В пул уходят только чтения; запросы с записью выполняются как у обычных
+# синхронных представлений под ASGI - по одному в общем потоке.
+POOLED_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+def async_view(view):
+    """Асинхронная обёртка над синхронным представлением."""
+
+    def run(request, *args, **kwargs):
+        response = view(request, *args, **kwargs)
+        if callable(getattr(response, 'render', None)):
+            timed_render(response)
+        return response
+
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if request.method not in POOLED_METHODS:
+            return await sync_to_async(run, thread_sensitive=True)(
+                request, *args, **kwargs)
+        context = contextvars.copy_context()
+        return await asyncio.get_running_loop().run_in_executor(
+            view_executor, functools.partial(
+                context.run, run_query, run, request, *args, **kwargs))
+
+    return wrapper
+
+
+def async_patterns(patterns):
+    return [
+        URLPattern(pattern.pattern, async_view(pattern.callback),
+                   pattern.default_args, pattern.name)
+        for pattern in patterns]
+
+
+def load_ingredients(recipe_id):
+    return list(RecipeIngredient.objects.filter(
+        recipe_id=recipe_id).select_related('ingredient'))
+
+
+def load_tag_ids(recipe_id):
+    return load_recipe_tags((recipe_id,)).get(recipe_id, [])
+
+
+class ConcurrentRecipeViewSet(RecipeViewSet):
+    """Рецепты, у которых при просмотре одного рецепта строка рецепта,
+    ингредиенты и теги загружаются параллельными запросами.
+    """
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action == 'retrieve':
+            queryset = queryset.prefetch_related(None)
+        return queryset
+
+    def get_object(self):
+        try:
+            recipe_id = int(self.kwargs[self.lookup_field])
+        except (KeyError, ValueError):
+            recipe_id = None
+        if self.action != 'retrieve' or recipe_id is None:
+            return super().get_object()
+        ingredients = tag_ids = None
+        if self.wants('ingredients'):
+            ingredients = query_executor.submit(
+                contextvars.copy_context().run,
+                run_query, load_ingredients, recipe_id)
+        if self.wants('tags'):
+            tag_ids = query_executor.submit(
+                contextvars.copy_context().run,
+                run_query, load_tag_ids, recipe_id)
+        recipe = super().get_object()
+        if ingredients is not None:
+            queryset = recipe.recipe_ingredient.all()
+            queryset._result_cache = ingredients.result()
+            queryset._prefetch_done = True
+            recipe._prefetched_objects_cache = {
+                'recipe_ingredient': queryset}
+        if tag_ids is not None:
+            recipe_tags_loader(self.request).cache[recipe.pk] = (
+                tag_ids.result())
+        return recipe
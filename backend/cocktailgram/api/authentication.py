@@ -0,0 +1,91 @@
+import threading
+import time
+from collections import OrderedDict
+from hashlib import sha256
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+
+from users.models import User
+from .versions import bump_version, get_version, shared_cache
+
+
+def version_key(user_id):
+    return f'auth_user_version:{user_id}'
+
+
+def invalidate_user(*user_ids):
+    """Сброс закэшированных токенов пользователей во всех процессах."""
+    for user_id in user_ids:
+        bump_version(version_key(user_id))
+
+
+class TokenCache:
+    """LRU-кэш токенов в памяти процесса с ограниченным временем жизни."""
+
+    def __init__(self, size, ttl):
+        self.size = size
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+
+token_cache = TokenCache(settings.TOKEN_CACHE_SIZE, settings.TOKEN_CACHE_TTL)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication без поиска токена в БД на каждый запрос.
+
+    Соответствие «токен -> id пользователя» хранится в LRU процесса и,
+    при TOKEN_CACHE_SHARED, в общем кэше Django. Запись действительна,
+    пока не сменилась версия пользователя: её увеличивают удаление токена
+    (logout) и сохранение пользователя. Сам пользователь читается заново
+    по первичному ключу. Версии должны быть видны всем процессам, поэтому
+    с локальным для процесса кэшем (LocMemCache) кэширование отключено.
+    """
+
+    def authenticate_credentials(self, key):
+        if not shared_cache():
+            return super().authenticate_credentials(key)
+        cache_key = f'auth_token:{sha256(key.encode()).hexdigest()}'
+        entry = token_cache.get(cache_key)
+        if entry is None and settings.TOKEN_CACHE_SHARED:
+            entry = cache.get(cache_key)
+            if entry is not None:
+                token_cache.set(cache_key, entry)
+        if entry is not None:
+            user_id, version = entry
+            if version == get_version(version_key(user_id)):
+                user = User.objects.filter(pk=user_id).first()
+                if user is None or not user.is_active:
+                    raise AuthenticationFailed(
+                        _('User inactive or deleted.'))
+                return user, Token(key=key, user=user)
+        user, token = super().authenticate_credentials(key)
+        entry = (user.pk, get_version(version_key(user.pk)))
+        token_cache.set(cache_key, entry)
+        if settings.TOKEN_CACHE_SHARED:
+            cache.set(cache_key, entry, settings.TOKEN_CACHE_TTL)
+        return user, token
@@ -0,0 +1,66 @@
+from bisect import bisect_left
+
+from recipes.models import Ingredient
+from .versions import VersionedSnapshot
+
+SEARCH_LIMIT = 50
+MAX_INDEX_SIZE = 100_000
+FIELDS = ('id', 'name', 'measurement_unit')
+
+
+def search_db(query, limit):
+    """Поиск в БД: сначала совпадения с начала названия, затем внутри."""
+    queryset = Ingredient.objects.values(*FIELDS)
+    result = list(queryset.filter(name__istartswith=query)[:limit])
+    if len(result) < limit:
+        result += queryset.filter(name__icontains=query).exclude(
+            name__istartswith=query)[:limit - len(result)]
+    return result
+
+
+class IngredientIndex(VersionedSnapshot):
+    """Отсортированный индекс названий ингредиентов в памяти процесса.
+
+    Совпадения с начала названия ищутся бинарным поиском, затем
+    добираются совпадения внутри названия. Индекс перестраивается при
+    смене версии в кэше, а для слишком больших таблиц поиск уходит в БД.
+    """
+
+    version_key = 'ingredients_version'
+    keys = items = None
+
+    def load(self):
+        rows = Ingredient.objects.order_by().values_list(*FIELDS)
+        if rows.count() > MAX_INDEX_SIZE:
+            keys = items = None
+        else:
+            rows = sorted(
+                (name.casefold(), ingredient_id, name, unit)
+                for ingredient_id, name, unit in rows.iterator())
+            keys = [row[0] for row in rows]
+            items = [dict(zip(FIELDS, row[1:])) for row in rows]
+        self.keys, self.items = keys, items
+
+    def search(self, query, limit=SEARCH_LIMIT):
+        limit = min(limit, SEARCH_LIMIT)
+        self.ensure_loaded()
+        keys, items = self.keys, self.items
+        if keys is None:
+            return search_db(query, limit)
+        prefix = query.casefold()
+        result = []
+        position = bisect_left(keys, prefix)
+        while (position < len(keys) and len(result) < limit
+               and keys[position].startswith(prefix)):
+            result.append(items[position])
+            position += 1
+        if len(result) < limit:
+            for key, item in zip(keys, items):
+                if prefix in key and not key.startswith(prefix):
+                    result.append(item)
+                    if len(result) == limit:
+                        break
+        return result
+
+
+ingredient_index = IngredientIndex()
@@ -1,16 +1,84 @@
 import base64
+import binascii
+from uuid import uuid4
 
-from django.core.files.base import ContentFile
+from django.conf import settings
+from django.core.files.uploadedfile import TemporaryUploadedFile
 from rest_framework import serializers
 
+from .registry import tag_registry
+
+DECODE_CHUNK_SIZE = 64 * 1024
+
+
+class DecodedImageFile(TemporaryUploadedFile):
+    """Временный файл изображения, который хранилище может переместить."""
+
+    def __del__(self):
+        self.close()
+
 
 class Base64ImageField(serializers.ImageField):
-    """Кастомный тип поля base64."""
+    """Кастомный тип поля base64.
+
+    Строка декодируется частями во временный файл, размер изображения
+    ограничен RECIPE_IMAGE_MAX_SIZE.
+    """
+
+    default_error_messages = {
+        'max_size': 'Размер изображения больше {max_size} байт.',
+    }
 
     def to_internal_value(self, data):
         if isinstance(data, str) and data.startswith('data:image'):
-            format, imgstr = data.split(';base64,')
+            try:
+                format, imgstr = data.split(';base64,')
+            except ValueError:
+                self.fail('invalid')
+            max_size = settings.RECIPE_IMAGE_MAX_SIZE
+            if len(imgstr) // 4 * 3 > max_size:
+                self.fail('max_size', max_size=max_size)
             ext = format.split('/')[-1]
-            data = ContentFile(base64.b64decode(imgstr), name='temp.' + ext)
+            data = DecodedImageFile(
+                f'{uuid4().hex}.{ext}', format[5:], 0, None)
+            try:
+                for start in range(0, len(imgstr), DECODE_CHUNK_SIZE):
+                    data.write(base64.b64decode(
+                        imgstr[start:start + DECODE_CHUNK_SIZE]))
+            except binascii.Error:
+                self.fail('invalid')
+            data.size = data.tell()
+            data.seek(0)
 
         return super().to_internal_value(data)
+
+
+class ThumbnailImageField(serializers.ImageField):
+    """Изображение рецепта: готовая миниатюра, иначе оригинал.
+
+    Миниатюра не отдаётся, если в контексте thumbnails=False.
+    """
+
+    def __init__(self, **kwargs):
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def get_attribute(self, instance):
+        if self.context.get('thumbnails', True) and instance.image_thumbnail:
+            return instance.image_thumbnail
+        return instance.image
+
+
+class TagPrimaryKeyField(serializers.PrimaryKeyRelatedField):
+    """Тег по id, проверяемый по реестру тегов без запроса в БД."""
+
+    def to_internal_value(self, data):
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            tag = tag_registry.get(int(data))
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        if tag is None:
+            self.fail('does_not_exist', pk_value=data)
+        return tag
@@ -1,39 +1,72 @@
 import django_filters
-from rest_framework.filters import SearchFilter
+from django.db.models import Exists, OuterRef
 
-from recipes.models import Recipe, Tag
+from recipes.models import Recipe, RecipeInFavorite, RecipeInShoppingCart
+from recipes.search import search_recipes
+from .registry import tag_registry
 
 
-class IngredientFilter(SearchFilter):
-    """Ингредиент-фильтр."""
-
-    search_param = 'name'
+def tag_choices():
+    return tag_registry.slug_choices()
 
 
 class RecipeFilter(django_filters.FilterSet):
-    """Рецепт-фильтр."""
+    """Рецепт-фильтр.
+
+    Теги, корзина и избранное проверяются подзапросами EXISTS, поэтому
+    рецепты не дублируются и DISTINCT не нужен. tags_mode=all оставляет
+    рецепты со всеми выбранными тегами, any (по умолчанию) - хотя бы с
+    одним.
+    """
 
-    tags = django_filters.ModelMultipleChoiceFilter(
-        queryset=Tag.objects.all(),
-        field_name='tags__slug',
-        to_field_name='slug')
+    tags = django_filters.MultipleChoiceFilter(
+        choices=tag_choices,
+        method='filter_tags')
+    tags_mode = django_filters.ChoiceFilter(
+        choices=(('any', 'any'), ('all', 'all')),
+        method='filter_tags_mode')
     is_in_shopping_cart = django_filters.NumberFilter(
         method='filter_is_in_shopping_cart')
     is_favorited = django_filters.NumberFilter(
         method='filter_is_favorited')
+    search = django_filters.CharFilter(method='filter_search')
 
     class Meta:
         model = Recipe
         fields = ('author', 'tags',)
 
+    def filter_tags(self, queryset, name, value):
+        if not value:
+            return queryset
+        tag_ids = {tag_registry.get_by_slug(slug).id for slug in value}
+        recipe_tags = Recipe.tags.through.objects.filter(
+            recipe_id=OuterRef('pk'))
+        if self.form.cleaned_data.get('tags_mode') == 'all':
+            for tag_id in tag_ids:
+                queryset = queryset.filter(
+                    Exists(recipe_tags.filter(tag_id=tag_id)))
+            return queryset
+        return queryset.filter(Exists(recipe_tags.filter(tag_id__in=tag_ids)))
+
+    def filter_tags_mode(self, queryset, name, value):
+        return queryset
+
+    def filter_search(self, queryset, name, value):
+        value = value.strip()
+        if not value:
+            return queryset
+        return search_recipes(queryset, value)
+
     def filter_is_in_shopping_cart(self, queryset, name, value):
         user = self.request.user
         if value == 1 and not user.is_anonymous:
-            return queryset.filter(cart__user=user)
+            return queryset.filter(Exists(RecipeInShoppingCart.objects.filter(
+                user=user, recipe=OuterRef('pk'))))
         return queryset
 
     def filter_is_favorited(self, queryset, name, value):
         user = self.request.user
         if value == 1 and not user.is_anonymous:
-            return queryset.filter(favorites__user=user)
+            return queryset.filter(Exists(RecipeInFavorite.objects.filter(
+                user=user, recipe=OuterRef('pk'))))
         return queryset
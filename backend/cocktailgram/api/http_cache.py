@@ -0,0 +1,90 @@
+from hashlib import md5
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from django.utils.cache import patch_vary_headers
+from django.utils.http import http_date, parse_http_date_safe
+from rest_framework import status
+from rest_framework.response import Response
+
+from cocktailgram import db_router
+from .versions import bump_version, get_version
+
+VERSION_KEY = 'recipes_version'
+MODIFIED_KEY = 'recipes_modified'
+
+
+def recipes_changed():
+    """Сброс кэша ответов с рецептами у всех процессов."""
+    bump_version(VERSION_KEY)
+    cache.set(MODIFIED_KEY, int(timezone.now().timestamp()), None)
+    db_router.pin('recipes')
+
+
+class AnonymousCacheMixin:
+    """Кэш ответов list/retrieve для анонимных пользователей.
+
+    Ключ и сильный ETag строятся из версии данных рецептов, пути и
+    нормализованной строки запроса. Условные запросы получают 304 без
+    обращения к сериализатору, Cache-Control позволяет кэшировать ответ
+    и nginx.
+    """
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            super().retrieve, request, *args, **kwargs)
+
+    def get_etag(self, request):
+        query = urlencode(sorted(
+            (key, value)
+            for key, values in request.query_params.lists()
+            for value in values))
+        digest = md5(
+            f'{get_version(VERSION_KEY)}:{request.accepted_media_type}:'
+            f'{request.path}?{query}'.encode()).hexdigest()
+        return f'"{digest}"'
+
+    def is_not_modified(self, request, etag, last_modified):
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+        if if_none_match is not None:
+            return etag in (tag.strip() for tag in if_none_match.split(','))
+        if_modified_since = parse_http_date_safe(
+            request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+        return (if_modified_since is not None
+                and last_modified <= if_modified_since)
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        if not request.user.is_anonymous:
+            return handler(request, *args, **kwargs)
+        etag = self.get_etag(request)
+        last_modified = cache.get_or_set(
+            MODIFIED_KEY, int(timezone.now().timestamp()), None)
+        headers = {
+            'ETag': etag,
+            'Last-Modified': http_date(last_modified),
+            'Cache-Control':
+                f'public, max-age={settings.RECIPES_CACHE_MAX_AGE}',
+        }
+        if self.is_not_modified(request, etag, last_modified):
+            return Response(status=status.HTTP_304_NOT_MODIFIED,
+                            headers=headers)
+        key = f'response:{etag}'
+        data = cache.get(key)
+        if data is None:
+            response = handler(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            data = response.data
+            cache.set(key, data, settings.RECIPES_CACHE_TIMEOUT)
+        return Response(data, headers=headers)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(
+            request, response, *args, **kwargs)
+        patch_vary_headers(response, ('Authorization',))
+        return response
@@ -0,0 +1,165 @@
+import time
+from array import array
+from bisect import bisect_left, insort
+from collections import Counter, defaultdict
+
+from django.core.cache import cache
+
+from recipes.models import RecipeIngredient
+from .versions import VersionedSnapshot, bump_version, get_version
+
+MAX_INGREDIENTS = 100
+MAX_PATCH = 1000
+CHANGES_TIMEOUT = 60 * 60
+PENDING_TIMEOUT = 5
+
+
+def change_key(number):
+    return f'inventory_change:{number}'
+
+
+class RecipeInventoryIndex(VersionedSnapshot):
+    """Обратный индекс «ингредиент -> отсортированный массив id рецептов».
+
+    Каждое изменение состава рецептов получает номер версии, а его id
+    рецептов кладутся в кэш под этим номером. Процесс, отставший на
+    несколько версий, перечитывает из БД только эти рецепты; при потере
+    записи или большом отставании индекс строится заново.
+    """
+
+    version_key = 'inventory_version'
+
+    def __init__(self):
+        super().__init__()
+        self.postings = {}
+        self.recipes = {}
+        self.pending_since = None
+
+    def load(self):
+        postings = defaultdict(lambda: array('q'))
+        recipes = defaultdict(list)
+        for recipe_id, ingredient_id in RecipeIngredient.objects.order_by(
+            'ingredient_id', 'recipe_id'
+        ).values_list('recipe_id', 'ingredient_id').iterator():
+            postings[ingredient_id].append(recipe_id)
+            recipes[recipe_id].append(ingredient_id)
+        self.postings = dict(postings)
+        self.recipes = {
+            recipe_id: tuple(ingredients)
+            for recipe_id, ingredients in recipes.items()}
+
+    def ensure_loaded(self):
+        version = get_version(self.version_key)
+        if version == self.version:
+            return
+        with self.lock:
+            if version == self.version:
+                return
+            if self.version is None or version - self.version > MAX_PATCH:
+                self.load()
+                self.version = version
+                return
+            numbers = range(self.version + 1, version + 1)
+            changes = cache.get_many(
+                [change_key(number) for number in numbers])
+            recipe_ids = set()
+            applied = self.version
+            for number in numbers:
+                if change_key(number) not in changes:
+                    break
+                if changes[change_key(number)] is None:
+                    self.load()
+                    self.version = version
+                    return
+                recipe_ids.update(changes[change_key(number)])
+                applied = number
+            if applied < version:
+                # Номер уже выдан, но запись в кэш ещё не сделана или
+                # потеряна: ждём её недолго, затем строим индекс заново.
+                now = time.monotonic()
+                self.pending_since = self.pending_since or now
+                if now - self.pending_since > PENDING_TIMEOUT:
+                    self.load()
+                    self.version = version
+                    self.pending_since = None
+                    return
+            else:
+                self.pending_since = None
+            self.patch(recipe_ids)
+            self.version = applied
+
+    def patch(self, recipe_ids):
+        current = defaultdict(set)
+        for recipe_id, ingredient_id in RecipeIngredient.objects.filter(
+            recipe_id__in=recipe_ids
+        ).values_list('recipe_id', 'ingredient_id'):
+            current[recipe_id].add(ingredient_id)
+        for recipe_id in recipe_ids:
+            old = set(self.recipes.pop(recipe_id, ()))
+            new = current.get(recipe_id, set())
+            for ingredient_id in old - new:
+                posting = self.postings[ingredient_id]
+                del posting[bisect_left(posting, recipe_id)]
+            for ingredient_id in new - old:
+                insort(self.postings.setdefault(
+                    ingredient_id, array('q')), recipe_id)
+            if new:
+                self.recipes[recipe_id] = tuple(sorted(new))
+
+    def record(self, recipe_ids):
+        version = bump_version(self.version_key)
+        cache.set(change_key(version), recipe_ids, CHANGES_TIMEOUT)
+
+    def recipes_changed(self, recipe_ids):
+        """Состав этих рецептов изменился; вызывается после коммита."""
+        self.record(sorted(set(recipe_ids)))
+
+    def bump(self):
+        self.record(None)
+
+    def can_make(self, ingredient_ids, missing=0):
+        """Рецепты, которым не хватает не больше missing ингредиентов.
+
+        Возвращает пары (id рецепта, число недостающих) по возрастанию
+        недостающих, затем от новых к старым. Учитываются только рецепты,
+        в которых есть хотя бы один из переданных ингредиентов.
+        """
+        self.ensure_loaded()
+        hits = Counter()
+        for ingredient_id in set(ingredient_ids):
+            hits.update(self.postings.get(ingredient_id, ()))
+        recipes = self.recipes
+        result = []
+        for recipe_id, count in hits.items():
+            lacking = len(recipes.get(recipe_id, ())) - count
+            if lacking <= missing:
+                result.append((lacking, -recipe_id))
+        result.sort()
+        return [(-recipe_id, lacking) for lacking, recipe_id in result]
+
+    def containing(self, ingredient_ids):
+        """Рецепты, в которых есть все переданные ингредиенты.
+
+        Возвращает пары (id рецепта, число прочих ингредиентов) по
+        возрастанию прочих, затем от новых к старым.
+        """
+        self.ensure_loaded()
+        ingredient_ids = set(ingredient_ids)
+        postings = sorted(
+            (self.postings.get(ingredient_id, ())
+             for ingredient_id in ingredient_ids), key=len)
+        if not postings or not postings[0]:
+            return []
+        matches = set(postings[0])
+        for posting in postings[1:]:
+            matches.intersection_update(posting)
+            if not matches:
+                return []
+        recipes = self.recipes
+        result = sorted(
+            (len(recipes.get(recipe_id, ())) - len(ingredient_ids), -recipe_id)
+            for recipe_id in matches)
+        return [(-recipe_id, extra) for extra, recipe_id in result]
+
+
+inventory_index = RecipeInventoryIndex()
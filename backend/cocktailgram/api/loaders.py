@@ -0,0 +1,81 @@
+from collections import defaultdict
+
+from rest_framework import serializers
+
+from .mixins import TimedSerializerMixin
+from recipes.models import Recipe
+from users.models import Subscribe
+
+
+class BatchLoader:
+    """Пакетная загрузка значений по ключам в рамках одного запроса.
+
+    Ключи копятся через prime(), а при первом load() все накопленные
+    ключи разрешаются одним вызовом batch_load(keys) -> dict.
+    """
+
+    def __init__(self, batch_load, default=None):
+        self.batch_load = batch_load
+        self.default = default
+        self.pending = set()
+        self.cache = {}
+
+    def prime(self, keys):
+        self.pending.update(key for key in keys if key not in self.cache)
+
+    def load(self, key):
+        if key not in self.cache:
+            self.pending.add(key)
+            loaded = self.batch_load(self.pending)
+            for pending_key in self.pending:
+                self.cache[pending_key] = loaded.get(
+                    pending_key, self.default)
+            self.pending = set()
+        return self.cache[key]
+
+
+def get_loader(request, name, batch_load, default=None):
+    """Загрузчик name, общий для всех сериализаторов запроса."""
+    try:
+        loaders = request.batch_loaders
+    except AttributeError:
+        loaders = request.batch_loaders = {}
+    if name not in loaders:
+        loaders[name] = BatchLoader(batch_load, default)
+    return loaders[name]
+
+
+def subscriptions_loader(request):
+    """Подписан ли текущий пользователь на авторов с данными id."""
+    user = request.user
+
+    def batch_load(author_ids):
+        return dict.fromkeys(
+            Subscribe.objects.filter(
+                user=user, author_id__in=author_ids
+            ).values_list('author_id', flat=True), True)
+
+    return get_loader(request, 'is_subscribed', batch_load, False)
+
+
+def load_recipe_tags(recipe_ids):
+    """id тегов рецептов: только строки связующей таблицы."""
+    tag_ids = defaultdict(list)
+    for recipe_id, tag_id in Recipe.tags.through.objects.filter(
+        recipe_id__in=recipe_ids
+    ).order_by('tag_id').values_list('recipe_id', 'tag_id'):
+        tag_ids[recipe_id].append(tag_id)
+    return tag_ids
+
+
+def recipe_tags_loader(request):
+    return get_loader(request, 'recipe_tags', load_recipe_tags, ())
+
+
+class BatchListSerializer(TimedSerializerMixin, serializers.ListSerializer):
+    """Список, заранее передающий объекты в загрузчики сериализатора."""
+
+    def to_representation(self, data):
+        iterable = list(data.all() if hasattr(data, 'all') else data)
+        self.child.prime_loaders(iterable)
+        return [self.child.to_representation(item) for item in iterable]
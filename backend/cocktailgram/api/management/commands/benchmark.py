@@ -0,0 +1,281 @@
+import base64
+import io
+import json
+import os
+import statistics
+import time
+import tracemalloc
+from urllib.parse import quote, urlparse
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.management import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count, Exists, OuterRef
+from django.test.utils import CaptureQueriesContext, override_settings
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api import shopping_cart
+from api.autocomplete import ingredient_index
+from api.http_cache import recipes_changed
+from recipes.models import (Ingredient, Recipe, RecipeIngredient,
+                            RecipeInShoppingCart, Tag)
+from users.models import User
+from .loadtest import percentile
+
+BASELINE_PATH = os.path.join(settings.BASE_DIR, 'data', 'benchmark.json')
+# Рецепт для создания и изменения не зависит от данных в базе.
+BENCHMARK_INGREDIENTS = 5
+
+
+class Rollback(Exception):
+    """Откат транзакции после запроса с записью."""
+
+
+def image_data():
+    buffer = io.BytesIO()
+    Image.new('RGB', (64, 64), (226, 108, 45)).save(buffer, 'PNG')
+    return 'data:image/png;base64,' + base64.b64encode(
+        buffer.getvalue()).decode()
+
+
+class Command(BaseCommand):
+    """Бенчмарк эндпоинтов API на текущей базе (seed_data).
+
+    Запросы идут через тестовый клиент в этом процессе, без сервера.
+    Для каждого сценария записываются перцентили задержки, число SQL-
+    запросов и пиковая память Python (tracemalloc, отдельным прогоном).
+    Сценарии с суффиксом _cold перед каждым запросом сбрасывают свой
+    кэш. С --save результаты становятся базовыми, без него сравниваются с
+    базовыми: рост p95 больше --threshold или рост числа запросов
+    считается регрессией. Задержки сравниваются, только если база и
+    объём данных совпадают с базовыми.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=30)
+        parser.add_argument('--warmup', type=int, default=3)
+        parser.add_argument('--memory-iterations', type=int, default=3)
+        parser.add_argument('--only', action='append', dest='only',
+                            help='Запустить только этот сценарий')
+        parser.add_argument('--baseline', default=BASELINE_PATH)
+        parser.add_argument('--save', action='store_true',
+                            help='Сохранить результаты как базовые')
+        parser.add_argument('--threshold', type=float, default=0.25,
+                            help='Допустимый рост p95, доля')
+
+    def handle(self, *args, **options):
+        scenarios = self.scenarios()
+        if options['only']:
+            unknown = set(options['only']) - {name for name, *_ in scenarios}
+            if unknown:
+                raise CommandError(f'Нет сценариев: {", ".join(unknown)}')
+            scenarios = [scenario for scenario in scenarios
+                         if scenario[0] in options['only']]
+        results = {}
+        with override_settings(ALLOWED_HOSTS=['testserver']):
+            for name, client, method, path, data, reset in scenarios:
+                results[name] = self.measure(
+                    client, method, path, data, reset, options)
+                self.write_result(name, results[name])
+        report = {
+            'database': connection.vendor,
+            'dataset': self.dataset(),
+            'scenarios': results,
+        }
+        if options['save']:
+            with open(options['baseline'], 'w', encoding='utf-8') as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+            self.stdout.write(self.style.SUCCESS(
+                f'Базовые результаты сохранены в {options["baseline"]}.'))
+            return
+        if os.path.exists(options['baseline']):
+            self.compare(report, options['baseline'], options['threshold'])
+
+    def dataset(self):
+        return {
+            'users': User.objects.count(),
+            'recipes': Recipe.objects.count(),
+            'ingredients': Ingredient.objects.count(),
+        }
+
+    def client(self, user=None):
+        client = APIClient()
+        if user is not None:
+            token, _ = Token.objects.get_or_create(user=user)
+            client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        return client
+
+    def scenarios(self):
+        """Сценарии (имя, клиент, метод, путь, тело, сброс кэша) по данным
+        в базе.
+        """
+        user = User.objects.filter(
+            Exists(RecipeInShoppingCart.objects.filter(user=OuterRef('pk')))
+        ).annotate(subscriptions=Count('follower')).order_by(
+            '-subscriptions').first()
+        author = User.objects.order_by('-recipes_count').first()
+        recipe = Recipe.objects.order_by('-favorites_count', '-id').first()
+        if user is None or author is None or recipe is None:
+            raise CommandError(
+                'Нет данных для бенчмарка, запустите seed_data.')
+        own_recipe = author.recipes.first()
+        tags = list(Tag.objects.values_list('slug', flat=True)[:2])
+        ingredients = list(RecipeIngredient.objects.filter(
+            recipe=recipe).values_list('ingredient_id', flat=True))
+        word = Ingredient.objects.get(pk=ingredients[0]).name.split()[0]
+        client = self.client(user)
+        author_client = self.client(author)
+        fixed_ingredients = list(Ingredient.objects.order_by(
+            'id').values_list('id', flat=True)[:BENCHMARK_INGREDIENTS])
+        new_recipe = {
+            'name': 'Бенчмарк',
+            'text': 'Рецепт из бенчмарка.',
+            'cooking_time': 5,
+            'image': image_data(),
+            'tags': list(Tag.objects.values_list('id', flat=True)[:2]),
+            'ingredients': [
+                {'id': ingredient_id, 'amount': 10}
+                for ingredient_id in fixed_ingredients],
+        }
+        search = f'/api/ingredients/?name={quote(word[:3])}'
+        return [
+            ('recipes_list', client, 'get', '/api/recipes/', None, None),
+            ('recipes_list_anonymous', self.client(), 'get',
+             '/api/recipes/', None, None),
+            ('recipes_list_anonymous_cold', self.client(), 'get',
+             '/api/recipes/', None, recipes_changed),
+            ('recipes_list_cursor', client, 'get',
+             '/api/recipes/?pagination=cursor', None, None),
+            ('recipe_detail', client, 'get',
+             f'/api/recipes/{recipe.pk}/', None, None),
+            ('recipes_filter_tags', client, 'get',
+             f'/api/recipes/?tags={tags[0]}&tags={tags[-1]}', None, None),
+            ('recipes_filter_tags_all', client, 'get',
+             f'/api/recipes/?tags={tags[0]}&tags={tags[-1]}&tags_mode=all',
+             None, None),
+            ('recipes_filter_author', client, 'get',
+             f'/api/recipes/?author={author.pk}', None, None),
+            ('recipes_filter_favorited', client, 'get',
+             '/api/recipes/?is_favorited=1', None, None),
+            ('recipes_filter_cart', client, 'get',
+             '/api/recipes/?is_in_shopping_cart=1', None, None),
+            ('recipes_search', client, 'get',
+             f'/api/recipes/?search={quote(word)}', None, None),
+            ('recipes_inventory', client, 'get',
+             '/api/recipes/inventory/?ingredients='
+             + ','.join(map(str, ingredients)), None, None),
+            ('recipe_create', client, 'post', '/api/recipes/', new_recipe,
+             None),
+            ('recipe_update', author_client, 'patch',
+             f'/api/recipes/{own_recipe.pk}/',
+             {'name': own_recipe.name, 'ingredients': [
+                 {'id': ingredient_id, 'amount': 20}
+                 for ingredient_id in fixed_ingredients],
+              'tags': new_recipe['tags']}, None),
+            ('subscriptions', client, 'get',
+             '/api/users/subscriptions/?recipes_limit=3', None, None),
+            ('feed', client, 'get', '/api/users/feed/', None, None),
+            ('ingredient_search', client, 'get', search, None, None),
+            ('ingredient_search_cold', client, 'get', search, None,
+             ingredient_index.bump),
+            ('download_shopping_cart', client, 'get',
+             '/api/recipes/download_shopping_cart/', None, None),
+            ('download_shopping_cart_cold', client, 'get',
+             '/api/recipes/download_shopping_cart/', None,
+             lambda: shopping_cart.bump_version(user.pk)),
+        ]
+
+    def request(self, client, method, path, data):
+        if method == 'get':
+            return getattr(client, method)(path)
+        try:
+            with transaction.atomic():
+                response = getattr(client, method)(path, data, format='json')
+                raise Rollback
+        except Rollback:
+            pass
+        image = response.data.get('image') if response.data else None
+        if method == 'post' and image:
+            name = urlparse(image).path[len(settings.MEDIA_URL):]
+            default_storage.delete(name)
+        return response
+
+    def measure(self, client, method, path, data, reset, options):
+        for _ in range(options['warmup']):
+            self.request(client, method, path, data)
+        latencies, queries, statuses = [], [], set()
+        for _ in range(options['iterations']):
+            if reset is not None:
+                reset()
+            with CaptureQueriesContext(connection) as context:
+                started = time.perf_counter()
+                response = self.request(client, method, path, data)
+                latencies.append(time.perf_counter() - started)
+            queries.append(len(context))
+            statuses.add(response.status_code)
+        tracemalloc.start()
+        for _ in range(options['memory_iterations']):
+            if reset is not None:
+                reset()
+            self.request(client, method, path, data)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        latencies.sort()
+        return {
+            'status': sorted(statuses),
+            'p50_ms': round(percentile(latencies, 0.5) * 1000, 2),
+            'p95_ms': round(percentile(latencies, 0.95) * 1000, 2),
+            'p99_ms': round(percentile(latencies, 0.99) * 1000, 2),
+            'queries': statistics.median_high(queries),
+            'peak_memory_kb': peak // 1024,
+        }
+
+    def write_result(self, name, result):
+        line = (
+            f'{name:<28} p50 {result["p50_ms"]:>8.1f} мс  '
+            f'p95 {result["p95_ms"]:>8.1f} мс  '
+            f'p99 {result["p99_ms"]:>8.1f} мс  '
+            f'запросов {result["queries"]:>3}  '
+            f'память {result["peak_memory_kb"]:>6} КБ  '
+            f'статус {",".join(map(str, result["status"]))}')
+        if any(status >= 400 for status in result['status']):
+            line = self.style.ERROR(line)
+        self.stdout.write(line)
+
+    def compare(self, report, path, threshold):
+        with open(path, encoding='utf-8') as f:
+            baseline = json.load(f)
+        comparable = True
+        if baseline['database'] != report['database']:
+            comparable = False
+            self.stdout.write(self.style.WARNING(
+                f'Базовые результаты сняты на {baseline["database"]}, '
+                f'задержки несравнимы.'))
+        if baseline.get('dataset') != report['dataset']:
+            comparable = False
+            self.stdout.write(self.style.WARNING(
+                f'Базовые результаты сняты на других данных '
+                f'({baseline.get("dataset")}), задержки несравнимы.'))
+        regressions = []
+        for name, result in report['scenarios'].items():
+            base = baseline['scenarios'].get(name)
+            if base is None:
+                continue
+            if result['queries'] > base['queries']:
+                regressions.append(
+                    f'{name}: запросов {base["queries"]} -> '
+                    f'{result["queries"]}')
+            if (comparable
+                    and result['p95_ms'] > base['p95_ms'] * (1 + threshold)):
+                regressions.append(
+                    f'{name}: p95 {base["p95_ms"]} -> '
+                    f'{result["p95_ms"]} мс')
+        if regressions:
+            raise CommandError(
+                'Регрессии относительно базовых результатов:\n'
+                + '\n'.join(regressions))
+        self.stdout.write(self.style.SUCCESS(
+            'Регрессий относительно базовых результатов нет.'))
@@ -0,0 +1,73 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import cycle, islice
+from urllib.error import URLError
+from urllib.request import Request, urlopen
+
+from django.core.management import BaseCommand
+
+READ_PATHS = (
+    '/api/recipes/',
+    '/api/recipes/?view=card',
+    '/api/tags/',
+    '/api/ingredients/?name=а',
+    '/api/users/me/',
+    '/api/users/subscriptions/',
+)
+
+
+def percentile(values, share):
+    return values[min(len(values) - 1, int(len(values) * share))]
+
+
+class Command(BaseCommand):
+    """Нагрузочный прогон читающих эндпоинтов для сравнения WSGI и ASGI.
+
+    Запустите один раз против gunicorn (cocktailgram.wsgi) и один раз
+    против профиля compose.asgi.yml с теми же параметрами.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('base_url')
+        parser.add_argument('--path', action='append', dest='paths')
+        parser.add_argument('--concurrency', type=int, default=64)
+        parser.add_argument('--requests', type=int, default=2000)
+        parser.add_argument('--token', help='Токен для Authorization')
+        parser.add_argument('--timeout', type=float, default=30)
+
+    def handle(self, *args, **options):
+        headers = {'Accept': 'application/json'}
+        if options['token']:
+            headers['Authorization'] = f'Token {options["token"]}'
+        paths = options['paths'] or READ_PATHS
+        if not options['token']:
+            paths = [path for path in paths if '/users/' not in path]
+        base_url = options['base_url'].rstrip('/')
+        timeout = options['timeout']
+
+        def fetch(path):
+            started = time.perf_counter()
+            try:
+                with urlopen(Request(base_url + path, headers=headers),
+                             timeout=timeout) as response:
+                    response.read()
+                    ok = response.status < 400
+            except (URLError, OSError):
+                ok = False
+            return time.perf_counter() - started, ok
+
+        urls = islice(cycle(paths), options['requests'])
+        started = time.perf_counter()
+        with ThreadPoolExecutor(options['concurrency']) as executor:
+            results = list(executor.map(fetch, urls))
+        elapsed = time.perf_counter() - started
+
+        latencies = sorted(latency for latency, _ in results)
+        errors = sum(not ok for _, ok in results)
+        self.stdout.write(
+            f'Запросов: {len(results)}, ошибок: {errors}, '
+            f'параллельно: {options["concurrency"]}\n'
+            f'RPS: {len(results) / elapsed:.1f}\n'
+            f'p50: {percentile(latencies, 0.5) * 1000:.1f} мс, '
+            f'p95: {percentile(latencies, 0.95) * 1000:.1f} мс, '
+            f'p99: {percentile(latencies, 0.99) * 1000:.1f} мс')
@@ -0,0 +1,70 @@
+from django.utils.functional import cached_property
+from rest_framework import serializers
+
+from cocktailgram.metrics import serializing
+
+
+class SparseFieldsMixin:
+    """Сериализатор, выводящий только запрошенные поля.
+
+    Набор полей берётся из контекста (fields, exclude) и применяется
+    только к объектам верхнего уровня, вложенные выводятся целиком.
+    """
+
+    def is_top_level(self):
+        parent = self.parent
+        return parent is None or (
+            isinstance(parent, serializers.ListSerializer)
+            and parent.parent is None)
+
+    def get_fields(self):
+        fields = super().get_fields()
+        if not self.is_top_level():
+            return fields
+        requested = self.context.get('fields')
+        excluded = self.context.get('exclude', ())
+        return {
+            name: field for name, field in fields.items()
+            if (requested is None or name in requested)
+            and name not in excluded}
+
+
+class TimedSerializerMixin:
+    """Сериализатор, время to_representation которого попадает в метрики
+    запроса (Server-Timing serialize).
+    """
+
+    def to_representation(self, instance):
+        with serializing():
+            return super().to_representation(instance)
+
+
+class SparseFieldsViewMixin:
+    """Разбор параметров fields, exclude и view (набор полей).
+
+    wants(name) позволяет не загружать данные для невыводимых полей.
+    """
+
+    field_presets = {}
+
+    @cached_property
+    def sparse_fields(self):
+        params = self.request.query_params
+        requested = self.field_presets.get(params.get('view'))
+        if params.get('fields'):
+            requested = params['fields'].split(',')
+        excluded = [name for name in params.get('exclude', '').split(',')
+                    if name]
+        return (
+            None if requested is None else frozenset(requested),
+            frozenset(excluded))
+
+    def wants(self, name):
+        requested, excluded = self.sparse_fields
+        return ((requested is None or name in requested)
+                and name not in excluded)
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['fields'], context['exclude'] = self.sparse_fields
+        return context
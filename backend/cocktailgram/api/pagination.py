@@ -1,4 +1,40 @@
-from rest_framework.pagination import PageNumberPagination
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from hashlib import md5
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db.models import Q
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound, ParseError
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from recipes import feed
+
+
+class CachedCountPaginator(Paginator):
+    """Пагинатор, кэширующий общее число объектов выборки.
+
+    Время жизни задаёт PAGINATION_COUNT_CACHE_TIMEOUT, 0 - точный подсчёт.
+    """
+
+    @cached_property
+    def count(self):
+        timeout = settings.PAGINATION_COUNT_CACHE_TIMEOUT
+        if not timeout or not hasattr(self.object_list, 'query'):
+            return super().count
+        sql, params = self.object_list.order_by().values(
+            'pk').query.sql_with_params()
+        key = 'count:' + md5(f'{sql}{params}'.encode()).hexdigest()
+        count = cache.get(key)
+        if count is None:
+            count = super().count
+            cache.set(key, count, timeout)
+        return count
 
 
 class PageNumberLimitPagination(PageNumberPagination):
@@ -6,3 +42,160 @@ class PageNumberLimitPagination(PageNumberPagination):
 
     page_size = 6
     page_size_query_param = 'limit'
+    django_paginator_class = CachedCountPaginator
+
+
+class CursorLimitPagination(BasePagination):
+    """Пагинация по ключу сортировки с непрозрачным курсором.
+
+    Следующая страница выбирается условием по ключу последнего объекта,
+    поэтому не нужны ни COUNT(*), ни OFFSET.
+    """
+
+    page_size = 6
+    page_size_query_param = 'limit'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    ordering = ('-pub_date', '-id')
+    invalid_cursor_message = 'Неверный курсор.'
+    ordering_message = (
+        'Курсор не поддерживает сортировку этой выборки (например, по '
+        'релевантности поиска), используйте постраничную пагинацию.')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        page_size = self.get_page_size(request)
+        position, reverse = self.decode_cursor(request, queryset.model)
+        ordering = self.ordering
+        if reverse:
+            ordering = tuple(
+                field[1:] if field.startswith('-') else f'-{field}'
+                for field in ordering)
+        results = self.fetch(queryset, position, ordering, page_size + 1)
+        has_more = len(results) > page_size
+        results = results[:page_size]
+        if reverse:
+            results.reverse()
+            self.has_next, self.has_previous = position is not None, has_more
+        else:
+            self.has_next, self.has_previous = has_more, position is not None
+        self.page = results
+        return results
+
+    def fetch(self, queryset, position, ordering, limit):
+        # Своя сортировка выборки (поиск по rank) не входит в ключ курсора:
+        # заменить её - значит молча выдать другой порядок.
+        if queryset.query.order_by and (
+                tuple(queryset.query.order_by) != self.ordering):
+            raise ParseError(self.ordering_message)
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            queryset = queryset.filter(self.after(position, ordering))
+        return list(queryset[:limit])
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(page_size, 1), self.max_page_size)
+
+    def after(self, position, ordering):
+        condition = Q()
+        for index, field in enumerate(ordering):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            equal = {
+                previous.lstrip('-'): position[number]
+                for number, previous in enumerate(ordering[:index])}
+            condition |= Q(**equal, **{f'{name}__{lookup}': position[index]})
+        return condition
+
+    def decode_cursor(self, request, model):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            values, reverse = json.loads(urlsafe_b64decode(encoded.encode()))
+            if len(values) != len(self.ordering):
+                raise ValueError
+            position = [
+                model._meta.get_field(field.lstrip('-')).to_python(value)
+                for field, value in zip(self.ordering, values)]
+        except (TypeError, ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+        return position, bool(reverse)
+
+    def encode_cursor(self, instance, reverse):
+        values = [
+            str(getattr(instance, field.lstrip('-')))
+            for field in self.ordering]
+        encoded = urlsafe_b64encode(
+            json.dumps([values, reverse]).encode()).decode()
+        return replace_query_param(
+            self.base_url, self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.page[0], True)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+
+class PageOrCursorPagination(BasePagination):
+    """Постраничная пагинация, а по запросу клиента - курсорная.
+
+    Курсорный режим включается параметром pagination=cursor и
+    сохраняется в ссылках next/previous через параметр cursor.
+    """
+
+    page_class = PageNumberLimitPagination
+    cursor_class = CursorLimitPagination
+
+    def paginate_queryset(self, queryset, request, view=None):
+        params = request.query_params
+        if params.get('pagination') == 'cursor' or 'cursor' in params:
+            self.paginator = self.cursor_class()
+        else:
+            self.paginator = self.page_class()
+        return self.paginator.paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        return self.paginator.get_paginated_response(data)
+
+
+class SubscriptionsCursorPagination(CursorLimitPagination):
+    ordering = ('id',)
+
+
+class SubscriptionsPagination(PageOrCursorPagination):
+    cursor_class = SubscriptionsCursorPagination
+
+
+class FeedPagination(CursorLimitPagination):
+    """Курсорная пагинация ленты подписок.
+
+    Ключи страницы берутся из ленты (recipes.feed.timeline), а рецепты
+    загружаются из переданной выборки одним запросом.
+    """
+
+    def fetch(self, queryset, position, ordering, limit):
+        ids = feed.timeline(
+            self.request.user, limit, position,
+            descending=ordering[0].startswith('-'))
+        recipes = queryset.in_bulk(ids)
+        return [recipes[pk] for pk in ids if pk in recipes]
@@ -0,0 +1,42 @@
+from recipes.models import Tag
+from .versions import VersionedSnapshot
+
+
+class TagRegistry(VersionedSnapshot):
+    """Все теги в памяти процесса: таблица маленькая и почти не меняется."""
+
+    version_key = 'tags_version'
+    data = by_id = by_slug = None
+
+    def load(self):
+        tags = list(Tag.objects.order_by('id'))
+        self.data = {
+            tag.id: {'id': tag.id, 'name': tag.name,
+                     'slug': tag.slug, 'color': tag.color}
+            for tag in tags}
+        self.by_id = {tag.id: tag for tag in tags}
+        self.by_slug = {tag.slug: tag for tag in tags}
+
+    def all(self):
+        self.ensure_loaded()
+        return list(self.data.values())
+
+    def get(self, tag_id):
+        self.ensure_loaded()
+        return self.by_id.get(tag_id)
+
+    def get_by_slug(self, slug):
+        self.ensure_loaded()
+        return self.by_slug.get(slug)
+
+    def represent(self, tag_ids):
+        self.ensure_loaded()
+        return [self.data[tag_id] for tag_id in tag_ids
+                if tag_id in self.data]
+
+    def slug_choices(self):
+        self.ensure_loaded()
+        return [(slug, tag.name) for slug, tag in self.by_slug.items()]
+
+
+tag_registry = TagRegistry()
@@ -1,14 +1,25 @@
 from djoser.serializers import UserSerializer
+from django.conf import settings
 from django.core.validators import MinValueValidator
+from django.db import transaction
 from rest_framework import serializers
 
-from .fields import Base64ImageField
+from .fields import Base64ImageField, TagPrimaryKeyField, ThumbnailImageField
+from .loaders import (BatchListSerializer, recipe_tags_loader,
+                      subscriptions_loader)
+from .http_cache import recipes_changed
+from .inventory import MAX_INGREDIENTS, inventory_index
+from .mixins import SparseFieldsMixin, TimedSerializerMixin
+from .registry import tag_registry
+from recipes import bulk
+from recipes.images import schedule_thumbnail
 from recipes.models import (Recipe, Tag, Ingredient, RecipeIngredient,
                             RecipeInFavorite, RecipeInShoppingCart)
 from users.models import User, Subscribe
 
 
-class UserSerializer(UserSerializer):
+class UserSerializer(TimedSerializerMixin, SparseFieldsMixin,
+                     UserSerializer):
     """Сериализатор пользователя."""
 
     is_subscribed = serializers.SerializerMethodField()
@@ -22,12 +33,24 @@ class UserSerializer(UserSerializer):
             'last_name',
             'email',
             'is_subscribed')
+        list_serializer_class = BatchListSerializer
+
+    def prime_loaders(self, users):
+        request = self.context.get('request')
+        if (request is None or request.user.is_anonymous
+                or 'is_subscribed' not in self.fields):
+            return
+        subscriptions_loader(request).prime(
+            user.id for user in users if not hasattr(user, 'is_subscribed'))
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         request = self.context.get('request')
-        if request is None or request.user.is_anonymous:
+        if (request is None or request.user.is_anonymous
+                or request.user.id == obj.id):
             return False
-        return obj.following.filter(user=request.user, author=obj).exists()
+        return subscriptions_loader(request).load(obj.id)
 
 
 class TagSerializer(serializers.ModelSerializer):
@@ -77,11 +100,50 @@ class IngredientCreateInRecipeSerializer(serializers.ModelSerializer):
         fields = ('id', 'amount')
 
 
+def unknown_ingredients(ids):
+    """Id ингредиентов, которых нет в базе, одним запросом."""
+    ids = set(ids)
+    return ids - set(Ingredient.objects.filter(
+        id__in=ids).values_list('id', flat=True))
+
+
+class RecipeBatchListSerializer(serializers.ListSerializer):
+    """Пакетное создание рецептов с проверкой всей пачки сразу."""
+
+    def to_internal_value(self, data):
+        items = super().to_internal_value(data)
+        unknown = unknown_ingredients(
+            item['id'] for attrs in items for item in attrs['ingredients'])
+        errors = []
+        for attrs in items:
+            error = {}
+            missing = {item['id'] for item in attrs['ingredients']} & unknown
+            if missing:
+                error['ingredients'] = [
+                    f'Ингредиенты не найдены: {sorted(missing)}']
+            errors.append(error)
+        if any(errors):
+            raise serializers.ValidationError(errors)
+        return items
+
+    def create(self, validated_data):
+        author = self.context.get('request').user
+        recipes = bulk.create_recipes([
+            {**attrs, 'author': author.id,
+             'tags': {tag.id for tag in attrs['tags']}}
+            for attrs in validated_data])
+        for recipe in recipes:
+            schedule_thumbnail(recipe)
+        transaction.on_commit(recipes_changed)
+        transaction.on_commit(lambda: inventory_index.recipes_changed(
+            recipe.pk for recipe in recipes))
+        return recipes
+
+
 class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
     """Сериализатор создания/изменения рецепта."""
 
-    tags = serializers.PrimaryKeyRelatedField(
-        queryset=Tag.objects.all(), many=True)
+    tags = TagPrimaryKeyField(queryset=Tag.objects.all(), many=True)
     author = UserSerializer(read_only=True)
     ingredients = IngredientCreateInRecipeSerializer(many=True)
     image = Base64ImageField()
@@ -98,8 +160,11 @@ class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
             'name',
             'text',
             'cooking_time')
+        list_serializer_class = RecipeBatchListSerializer
 
     def add_ingredients(self, recipe, ingredients):
+        if not ingredients:
+            return []
         ing_data = [RecipeIngredient(
             recipe=recipe,
             amount=ingredient['amount'],
@@ -107,6 +172,26 @@ class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
         ) for ingredient in ingredients]
         return RecipeIngredient.objects.bulk_create(ing_data)
 
+    def update_ingredients(self, recipe, ingredients):
+        current = {item.ingredient_id: item
+                   for item in recipe.recipe_ingredient.all()}
+        amounts = {item['id']: item['amount'] for item in ingredients}
+        removed = current.keys() - amounts.keys()
+        if removed:
+            recipe.recipe_ingredient.filter(
+                ingredient_id__in=removed).delete()
+        self.add_ingredients(recipe, [
+            item for item in ingredients if item['id'] not in current])
+        changed = []
+        for ingredient_id, item in current.items():
+            amount = amounts.get(ingredient_id)
+            if amount is not None and item.amount != amount:
+                item.amount = amount
+                changed.append(item)
+        if changed:
+            RecipeIngredient.objects.bulk_update(changed, ('amount',))
+
+    @transaction.atomic
     def create(self, validated_data):
         author = self.context.get('request').user
         tags = validated_data.pop('tags')
@@ -116,42 +201,47 @@ class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
         self.add_ingredients(recipe, ingredients)
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
-        tags = validated_data.pop('tags')
-        instance.tags.clear()
-        instance.tags.set(tags)
-        ingredients = validated_data.pop('ingredients')
-        instance.ingredients.clear()
-        self.add_ingredients(instance, ingredients)
-        instance = super().update(instance, validated_data)
-        return instance
+        tags = validated_data.pop('tags', None)
+        if tags is not None:
+            instance.tags.set(tags)
+        ingredients = validated_data.pop('ingredients', None)
+        if ingredients is not None:
+            self.update_ingredients(instance, ingredients)
+        return super().update(instance, validated_data)
 
     def to_representation(self, instance):
-        context = {'request': self.context.get('request')}
-        return RecipeListSerializer(instance, context=context).data
+        request = self.context.get('request')
+        # Сохранённый рецепт перечитывается одним запросом с флагами
+        # пользователя и ингредиентами, иначе ответ собирается по строке.
+        instance = Recipe.objects.with_related().with_user_flags(
+            getattr(request, 'user', None)).get(pk=instance.pk)
+        return RecipeListSerializer(
+            instance, context={'request': request}).data
 
     def validate_ingredients(self, ingredients):
-        ingredients_list = []
-        for ingredient in ingredients:
-            if ingredient['id'] in ingredients_list:
-                raise serializers.ValidationError(
-                    'Ингредиенты не могут повторяться!')
-            ingredients_list.append(ingredient['id'])
-            if int(ingredient['amount']) < 1:
-                raise serializers.ValidationError(
-                    'Минимальное количество ингредиента - 1!')
         if not ingredients:
             raise serializers.ValidationError('Пустое поле c ингредиентами!')
+        ids = [ingredient['id'] for ingredient in ingredients]
+        if len(set(ids)) != len(ids):
+            raise serializers.ValidationError(
+                'Ингредиенты не могут повторяться!')
+        if any(int(ingredient['amount']) < 1 for ingredient in ingredients):
+            raise serializers.ValidationError(
+                'Минимальное количество ингредиента - 1!')
+        if not isinstance(self.parent, serializers.ListSerializer):
+            unknown = unknown_ingredients(ids)
+            if unknown:
+                raise serializers.ValidationError(
+                    f'Ингредиенты не найдены: {sorted(unknown)}')
         return ingredients
 
     def validate_tags(self, tags):
-        tags_list = []
-        for tag in tags:
-            if tag in tags_list:
-                raise serializers.ValidationError('Теги не могут повторяться!')
-            tags_list.append(tag)
         if not tags:
             raise serializers.ValidationError('Пустое поле c тегом!')
+        if len(set(tags)) != len(tags):
+            raise serializers.ValidationError('Теги не могут повторяться!')
         return tags
 
     def validate_image(self, image):
@@ -160,17 +250,18 @@ class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
         return image
 
 
-class RecipeListSerializer(serializers.ModelSerializer):
+class RecipeListSerializer(TimedSerializerMixin, SparseFieldsMixin,
+                           serializers.ModelSerializer):
     """Сериализатор отображения рецепта."""
 
-    tags = TagSerializer(many=True)
+    tags = serializers.SerializerMethodField()
     author = UserSerializer()
     ingredients = RecipeIngredientSerializer(
         many=True,
         source='recipe_ingredient')
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
-    image = Base64ImageField()
+    image = ThumbnailImageField()
 
     class Meta:
         model = Recipe
@@ -185,14 +276,42 @@ class RecipeListSerializer(serializers.ModelSerializer):
             'image',
             'text',
             'cooking_time')
+        list_serializer_class = BatchListSerializer
+
+    def prime_loaders(self, recipes):
+        request = self.context.get('request')
+        if request is not None and 'tags' in self.fields:
+            recipe_tags_loader(request).prime(
+                recipe.id for recipe in recipes)
+        if 'author' in self.fields:
+            self.fields['author'].prime_loaders(
+                recipe.author for recipe in recipes
+                if not hasattr(recipe, 'author_is_subscribed'))
+
+    def to_representation(self, instance):
+        if hasattr(instance, 'author_is_subscribed'):
+            instance.author.is_subscribed = instance.author_is_subscribed
+        return super().to_representation(instance)
+
+    def get_tags(self, obj):
+        request = self.context.get('request')
+        if request is None:
+            tag_ids = obj.tags.values_list('id', flat=True)
+        else:
+            tag_ids = recipe_tags_loader(request).load(obj.id)
+        return tag_registry.represent(tag_ids)
 
     def get_is_favorited(self, obj):
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         request = self.context.get('request')
         if request is None or request.user.is_anonymous:
             return False
         return obj.favorites.filter(user=request.user).exists()
 
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         request = self.context.get('request')
         if request is None or request.user.is_anonymous:
             return False
@@ -202,6 +321,8 @@ class RecipeListSerializer(serializers.ModelSerializer):
 class RecipeInSubscribeSerializer(serializers.ModelSerializer):
     """Сериализатор отображения рецепта при подписке."""
 
+    image = ThumbnailImageField()
+
     class Meta:
         model = Recipe
         fields = (
@@ -220,7 +341,7 @@ class SubscribeSerializer(UserSerializer):
     last_name = serializers.ReadOnlyField()
     email = serializers.ReadOnlyField()
     is_subscribed = serializers.SerializerMethodField()
-    recipes_count = serializers.SerializerMethodField(read_only=True)
+    recipes_count = serializers.ReadOnlyField()
     recipes = serializers.SerializerMethodField(read_only=True)
 
     class Meta:
@@ -235,20 +356,14 @@ class SubscribeSerializer(UserSerializer):
             'recipes_count',
             'recipes')
 
-    def get_is_subscribed(self, obj):
-        request = self.context.get('request')
-        if request is None or request.user.is_anonymous:
-            return False
-        return obj.following.filter(user=request.user, author=obj).exists()
-
-    def get_recipes_count(self, obj):
-        return obj.recipes.count()
-
     def get_recipes(self, obj):
-        limit = self.context.get('request').GET.get('recipes_limit')
+        if hasattr(obj, 'limited_recipes'):
+            return RecipeInSubscribeSerializer(
+                obj.limited_recipes, many=True).data
+        limit = self.context.get('recipes_limit')
         recipes = obj.recipes.all()
-        if limit:
-            recipes = recipes[:int(limit)]
+        if limit is not None:
+            recipes = recipes[:limit]
         return RecipeInSubscribeSerializer(recipes, many=True).data
 
 
@@ -272,8 +387,8 @@ class SubscribeCreateSerializer(serializers.ModelSerializer):
         return value
 
     def to_representation(self, instance):
-        context = {'request': self.context.get('request')}
-        return SubscribeSerializer(instance.author, context=context).data
+        return SubscribeSerializer(
+            instance.author, context=self.context).data
 
 
 class RecipeInFavoriteSerializer(serializers.ModelSerializer):
@@ -312,3 +427,30 @@ class RecipeInShoppingCartSerializer(serializers.ModelSerializer):
         context = {'request': self.context.get('request')}
         return RecipeInSubscribeSerializer(
             instance.recipe, context=context).data
+
+
+class BulkIdsSerializer(serializers.Serializer):
+    """Список id для пакетных операций."""
+
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.BULK_IDS_MAX_SIZE)
+
+
+class RecipesLimitSerializer(serializers.Serializer):
+    """Число рецептов каждого автора в ответах о подписках."""
+
+    recipes_limit = serializers.IntegerField(min_value=1, required=False)
+
+
+class InventoryQuerySerializer(serializers.Serializer):
+    """Параметры подбора рецептов по имеющимся ингредиентам."""
+
+    ingredients = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=MAX_INGREDIENTS)
+    mode = serializers.ChoiceField(
+        choices=('make', 'contains'), default='make')
+    missing = serializers.IntegerField(min_value=0, default=0)
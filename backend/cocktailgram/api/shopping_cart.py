@@ -0,0 +1,118 @@
+import csv
+import io
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Sum
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+
+from recipes.models import RecipeIngredient
+from . import versions
+
+FONT_NAME = 'Arial'
+FONT_PATH = settings.BASE_DIR / 'static/ttf_arial/ArialRegular.ttf'
+PDF_CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def register_font():
+    """Регистрация шрифта для PDF, выполняется один раз при старте."""
+    pdfmetrics.registerFont(TTFont(FONT_NAME, FONT_PATH))
+
+
+def get_ingredients(user):
+    """Суммарное количество ингредиентов в корзине пользователя."""
+    return RecipeIngredient.objects.filter(
+        recipe__cart__user=user
+    ).values(
+        'ingredient__name',
+        'ingredient__measurement_unit'
+    ).annotate(amount_sum=Sum('amount')).order_by('ingredient__name')
+
+
+def version_key(user_id):
+    return f'shopping_cart_version:{user_id}'
+
+
+def bump_version(*user_ids):
+    """Сброс закэшированных выгрузок корзин пользователей."""
+    for user_id in user_ids:
+        versions.bump_version(version_key(user_id))
+
+
+def render_pdf(ingredients):
+    buffer = io.BytesIO()
+    p = canvas.Canvas(buffer)
+    p.setFont(FONT_NAME, 20)
+    start_cur = 800
+    p.drawString(50, start_cur, 'Shopping list:')
+    start_cur = 770
+    for ingredient in ingredients:
+        p.drawString(50, start_cur,
+                     f'{ingredient["ingredient__name"]} -'
+                     f'{ingredient["amount_sum"]} '
+                     f'{ingredient["ingredient__measurement_unit"]}')
+        start_cur -= 30
+        if start_cur <= 0:
+            start_cur = 800
+            p.showPage()
+            p.setFont(FONT_NAME, 20)
+
+    p.showPage()
+    p.save()
+    return buffer.getvalue()
+
+
+def get_pdf(user):
+    """PDF со списком покупок, закэшированный до изменения корзины."""
+    version = versions.get_version(version_key(user.id))
+    key = f'shopping_cart_pdf:{user.id}:{version}'
+    document = cache.get(key)
+    if document is None:
+        document = render_pdf(get_ingredients(user).iterator())
+        cache.set(key, document, PDF_CACHE_TIMEOUT)
+    return document
+
+
+def iter_txt(ingredients):
+    yield 'Shopping list:\n'
+    for ingredient in ingredients:
+        yield (f'{ingredient["ingredient__name"]} - '
+               f'{ingredient["amount_sum"]} '
+               f'{ingredient["ingredient__measurement_unit"]}\n')
+
+
+def iter_csv(ingredients):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(('name', 'amount', 'measurement_unit'))
+    for ingredient in ingredients:
+        writer.writerow((
+            ingredient['ingredient__name'],
+            ingredient['amount_sum'],
+            ingredient['ingredient__measurement_unit']))
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+def iter_json(ingredients):
+    separator = '['
+    for ingredient in ingredients:
+        yield separator + json.dumps({
+            'name': ingredient['ingredient__name'],
+            'amount': ingredient['amount_sum'],
+            'measurement_unit': ingredient['ingredient__measurement_unit'],
+        }, ensure_ascii=False)
+        separator = ','
+    yield ']' if separator == ',' else '[]'
+
+
+STREAM_FORMATS = {
+    'txt': (iter_txt, 'text/plain; charset=utf-8'),
+    'csv': (iter_csv, 'text/csv; charset=utf-8'),
+    'json': (iter_json, 'application/json'),
+}
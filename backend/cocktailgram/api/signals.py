@@ -0,0 +1,106 @@
+from django.db import transaction
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_save)
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from recipes.images import schedule_thumbnail
+from recipes.models import (Ingredient, Recipe, RecipeIngredient,
+                            RecipeInShoppingCart, Tag)
+from users.models import User
+from .authentication import invalidate_user
+from .autocomplete import ingredient_index
+from .http_cache import recipes_changed
+from .inventory import inventory_index
+from .registry import tag_registry
+from .shopping_cart import bump_version
+
+# Поля автора, которые попадают в ответы с рецептами.
+AUTHOR_FIELDS = ('username', 'first_name', 'last_name')
+
+
+@receiver((post_save, post_delete), sender=RecipeInShoppingCart)
+def cart_changed(sender, instance, **kwargs):
+    user_id = instance.user_id
+    transaction.on_commit(lambda: bump_version(user_id))
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_changed(sender, instance, created, **kwargs):
+    if not created:
+        user_ids = list(instance.cart.values_list('user_id', flat=True))
+        if user_ids:
+            transaction.on_commit(lambda: bump_version(*user_ids))
+
+
+@receiver(pre_save, sender=Recipe)
+def recipe_image_replaced(sender, instance, **kwargs):
+    if instance.pk and instance.image_thumbnail:
+        image_name = Recipe.objects.filter(
+            pk=instance.pk).values_list('image', flat=True).first()
+        if image_name != instance.image.name:
+            instance.image_thumbnail = ''
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_saved(sender, instance, **kwargs):
+    if instance.image and not instance.image_thumbnail:
+        schedule_thumbnail(instance)
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def ingredient_changed(sender, **kwargs):
+    transaction.on_commit(ingredient_index.bump)
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def tag_changed(sender, **kwargs):
+    transaction.on_commit(tag_registry.bump)
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+@receiver((post_save, post_delete), sender=RecipeIngredient)
+@receiver((post_save, post_delete), sender=Ingredient)
+@receiver((post_save, post_delete), sender=Tag)
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipe_data_changed(sender, action=None, **kwargs):
+    if action is None or action.startswith('post_'):
+        transaction.on_commit(recipes_changed)
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+    invalidate_user(instance.user_id)
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or set(update_fields) != {'last_login'}:
+        invalidate_user(instance.pk)
+
+
+@receiver(pre_save, sender=User)
+def author_renamed(sender, instance, update_fields=None, **kwargs):
+    instance._author_renamed = False
+    if instance.pk is None or (
+            update_fields is not None
+            and not set(update_fields) & set(AUTHOR_FIELDS)):
+        return
+    previous = User.objects.filter(
+        pk=instance.pk).values_list(*AUTHOR_FIELDS).first()
+    instance._author_renamed = previous != tuple(
+        getattr(instance, field) for field in AUTHOR_FIELDS)
+
+
+@receiver(post_save, sender=User)
+def author_changed(sender, instance, created, **kwargs):
+    if not created and getattr(instance, '_author_renamed', False):
+        transaction.on_commit(recipes_changed)
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+@receiver((post_save, post_delete), sender=RecipeIngredient)
+def recipe_composition_changed(sender, instance, **kwargs):
+    recipe_id = instance.pk if sender is Recipe else instance.recipe_id
+    transaction.on_commit(
+        lambda: inventory_index.recipes_changed((recipe_id,)))
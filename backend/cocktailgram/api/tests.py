@@ -0,0 +1,227 @@
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from recipes.models import (
+    FeedEntry, Ingredient, Recipe, RecipeIngredient, RecipeInFavorite,
+    RecipeInShoppingCart, Tag)
+from users.models import Subscribe, User
+from .registry import tag_registry
+
+
+def create_user(username):
+    return User.objects.create_user(
+        username=username, email=f'{username}@example.com',
+        first_name='Имя', last_name='Фамилия')
+
+
+def create_recipe(author, name):
+    return Recipe.objects.create(
+        author=author, name=name, text='Текст', image='images/recipe.png')
+
+
+# Реплика читает своим соединением и не видит данных незакрытой
+# транзакции теста, поэтому запросы к API идут только в primary.
+primary_only = override_settings(DATABASE_REPLICAS=[])
+
+
+class BulkRemoveCountersTests(TestCase):
+    """Пакетное удаление связей уменьшает счётчики ровно один раз."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('reader')
+        cls.author = create_user('author')
+        cls.recipes = [create_recipe(cls.author, f'Рецепт {index}')
+                       for index in range(2)]
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_favorites(self):
+        for recipe in self.recipes:
+            RecipeInFavorite.objects.create(user=self.user, recipe=recipe)
+        other = create_user('other')
+        RecipeInFavorite.objects.create(user=other, recipe=self.recipes[0])
+
+        response = self.client.delete(
+            '/api/recipes/favorite/',
+            {'ids': [self.recipes[0].pk, 999_999]}, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [item['status'] for item in response.data],
+            ['removed', 'not_found'])
+        counts = dict(Recipe.objects.values_list('pk', 'favorites_count'))
+        self.assertEqual(counts[self.recipes[0].pk], 1)
+        self.assertEqual(counts[self.recipes[1].pk], 1)
+
+    def test_subscriptions(self):
+        followers = [create_user(f'follower{index}') for index in range(2)]
+        for follower in (self.user, *followers):
+            Subscribe.objects.create(user=follower, author=self.author)
+        self.assertTrue(FeedEntry.objects.filter(user=self.user).exists())
+
+        response = self.client.delete(
+            '/api/users/subscribe/', {'ids': [self.author.pk]},
+            format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.followers_count, 2)
+        self.assertFalse(FeedEntry.objects.filter(user=self.user).exists())
+
+
+@primary_only
+class RecipeTagFilterTests(TestCase):
+    """Фильтр по нескольким тегам не дублирует рецепты."""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = create_user('author')
+        tags = [Tag.objects.create(name=slug, slug=slug, color=color)
+                for slug, color in (
+                    ('breakfast', '#E26C2D'), ('dinner', '#49B64E'))]
+        cls.recipes = [create_recipe(author, f'Рецепт {index}')
+                       for index in range(3)]
+        cls.recipes[0].tags.set(tags)
+        cls.recipes[1].tags.set(tags[1:])
+
+    def setUp(self):
+        cache.clear()
+
+    def test_any_mode_returns_each_recipe_once(self):
+        response = self.client.get(
+            '/api/recipes/', {'tags': ['breakfast', 'dinner']})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            sorted(recipe['id'] for recipe in response.json()['results']),
+            [self.recipes[0].pk, self.recipes[1].pk])
+
+
+@primary_only
+class RecipeQueryCountTests(TestCase):
+    """Число запросов выдачи рецептов не зависит от размера страницы."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('reader')
+        author = create_user('author')
+        tags = [Tag.objects.create(name=slug, slug=slug, color=color)
+                for slug, color in (
+                    ('breakfast', '#E26C2D'), ('dinner', '#49B64E'))]
+        ingredients = [
+            Ingredient.objects.create(name=name, measurement_unit='г')
+            for name in ('Лёд', 'Лайм')]
+        cls.recipes = [create_recipe(author, f'Рецепт {index}')
+                       for index in range(8)]
+        for recipe in cls.recipes:
+            recipe.tags.set(tags)
+            RecipeIngredient.objects.bulk_create(
+                RecipeIngredient(recipe=recipe, ingredient=ingredient,
+                                 amount=10)
+                for ingredient in ingredients)
+            RecipeInFavorite.objects.create(user=cls.user, recipe=recipe)
+        RecipeInShoppingCart.objects.create(
+            user=cls.user, recipe=cls.recipes[0])
+        Subscribe.objects.create(user=cls.user, author=author)
+
+    def reset(self):
+        # Без кэша ответов и числа объектов; теги уже в памяти процесса.
+        cache.clear()
+        tag_registry.bump()
+        tag_registry.slug_choices()
+
+    def clients(self):
+        authenticated = APIClient()
+        authenticated.force_authenticate(self.user)
+        return {'anonymous': APIClient(), 'authenticated': authenticated}
+
+    def assertQueries(self, path, number, size=None):
+        for name, client in self.clients().items():
+            self.reset()
+            with self.subTest(client=name), self.assertNumQueries(number):
+                response = client.get(path)
+                self.assertEqual(response.status_code, 200)
+                if size is not None:
+                    self.assertEqual(len(response.data['results']), size)
+
+    def test_list(self):
+        # COUNT, рецепты с автором и флагами, ингредиенты, теги.
+        for limit in (2, 8):
+            with self.subTest(limit=limit):
+                self.assertQueries(f'/api/recipes/?limit={limit}', 4, limit)
+
+    def test_retrieve(self):
+        self.assertQueries(f'/api/recipes/{self.recipes[0].pk}/', 3)
+
+
+@primary_only
+class CursorPaginationTests(TestCase):
+    """Курсорная пагинация только для сортировки по дате."""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = create_user('author')
+        for index in range(3):
+            create_recipe(author, f'Коктейль {index}')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_cursor(self):
+        response = self.client.get(
+            '/api/recipes/', {'pagination': 'cursor', 'limit': 2})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['results']), 2)
+        self.assertIsNotNone(response.json()['next'])
+
+    def test_cursor_with_search_is_rejected(self):
+        response = self.client.get(
+            '/api/recipes/', {'pagination': 'cursor', 'search': 'Коктейль'})
+
+        self.assertEqual(response.status_code, 400)
+
+
+@primary_only
+class RecipesLimitTests(TestCase):
+    """recipes_limit в подписках - положительное целое."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('reader')
+        cls.author = create_user('author')
+        for index in range(3):
+            create_recipe(cls.author, f'Рецепт {index}')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_subscriptions(self):
+        Subscribe.objects.create(user=self.user, author=self.author)
+        response = self.client.get(
+            '/api/users/subscriptions/', {'recipes_limit': 2})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results'][0]['recipes']), 2)
+        for limit in ('abc', '-1', '0'):
+            with self.subTest(limit=limit):
+                response = self.client.get(
+                    '/api/users/subscriptions/', {'recipes_limit': limit})
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('recipes_limit', response.data)
+
+    def test_subscribe(self):
+        url = f'/api/users/{self.author.pk}/subscribe/'
+
+        response = self.client.post(f'{url}?recipes_limit=abc')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Subscribe.objects.exists())
+        response = self.client.post(f'{url}?recipes_limit=1')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.data['recipes']), 1)
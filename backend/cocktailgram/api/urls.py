@@ -1,6 +1,8 @@
 from rest_framework.routers import DefaultRouter
+from django.conf import settings
 from django.urls import include, path
 
+from .async_views import ConcurrentRecipeViewSet, async_patterns
 from .views import RecipeViewSet, TagViewSet, IngredientViewSet, UserViewSet
 
 
@@ -8,11 +10,18 @@ router_v1 = DefaultRouter()
 
 router_v1.register('ingredients', IngredientViewSet, basename='ingredients')
 router_v1.register('tags', TagViewSet, basename='tags')
-router_v1.register('recipes', RecipeViewSet, basename='recipes')
+router_v1.register(
+    'recipes',
+    ConcurrentRecipeViewSet if settings.ASYNC_VIEWS else RecipeViewSet,
+    basename='recipes')
 router_v1.register('users', UserViewSet, basename='users')
 
+router_urls = router_v1.urls
+if settings.ASYNC_VIEWS:
+    router_urls = async_patterns(router_urls)
+
 urlpatterns = [
-    path('', include(router_v1.urls)),
+    path('', include(router_urls)),
     path('', include('djoser.urls')),
     path('auth/', include('djoser.urls.authtoken')),
 ]
@@ -0,0 +1,52 @@
+import threading
+
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache
+
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def shared_cache():
+    """Общий ли кэш для всех процессов: иначе версии видны только своему."""
+    return (settings.CACHES[DEFAULT_CACHE_ALIAS]['BACKEND']
+            not in PROCESS_LOCAL_CACHES)
+
+
+def get_version(key):
+    return cache.get_or_set(key, 1, None)
+
+
+def bump_version(key):
+    """Увеличить версию данных, общую для всех процессов."""
+    try:
+        return cache.incr(key)
+    except ValueError:
+        cache.set(key, 2, None)
+        return 2
+
+
+class VersionedSnapshot:
+    """Данные в памяти процесса, перечитываемые при смене версии."""
+
+    version_key = None
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.version = None
+
+    def load(self):
+        raise NotImplementedError
+
+    def ensure_loaded(self):
+        version = get_version(self.version_key)
+        if version != self.version:
+            with self.lock:
+                if version != self.version:
+                    self.load()
+                    self.version = version
+
+    def bump(self):
+        bump_version(self.version_key)
@@ -1,33 +1,43 @@
-import io
+from collections import defaultdict
 
-from django.http import FileResponse
+from django.conf import settings
+from django.http import Http404, HttpResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
-from django.db.models import Sum
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet
-from reportlab.pdfgen import canvas
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
 from rest_framework import viewsets, status
 from rest_framework.permissions import (IsAuthenticatedOrReadOnly,
                                         IsAuthenticated)
 from rest_framework.decorators import action
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 
 from recipes.models import (
     Recipe, Tag, Ingredient, RecipeInFavorite,
-    RecipeInShoppingCart, RecipeIngredient)
+    RecipeInShoppingCart)
+from recipes import bulk
 from users.models import User, Subscribe
-from .serializers import (TagSerializer, IngredientSerializer,
+from .serializers import (BulkIdsSerializer, TagSerializer,
+                          IngredientSerializer, InventoryQuerySerializer,
                           UserSerializer,
                           RecipeCreateUpdateSerializer,
                           RecipeListSerializer, SubscribeSerializer,
                           SubscribeCreateSerializer,
                           RecipeInFavoriteSerializer,
-                          RecipeInShoppingCartSerializer)
-from .filters import RecipeFilter, IngredientFilter
+                          RecipeInSubscribeSerializer,
+                          RecipeInShoppingCartSerializer,
+                          RecipesLimitSerializer)
+from .filters import RecipeFilter
+from .http_cache import AnonymousCacheMixin
+from .mixins import SparseFieldsViewMixin
 from .permissions import IsAuthorOrReadOnlyPermission
-from .pagination import PageNumberLimitPagination
+from .pagination import (FeedPagination, PageNumberLimitPagination,
+                         PageOrCursorPagination, SubscriptionsPagination)
+from .renderers import PDFRenderer, PlainTextRenderer, CSVRenderer
+from .autocomplete import ingredient_index
+from .inventory import inventory_index
+from .registry import tag_registry
+from . import shopping_cart
 
 
 class TagViewSet(viewsets.ReadOnlyModelViewSet):
@@ -36,8 +46,48 @@ class TagViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
 
+    def list(self, request, *args, **kwargs):
+        return Response(tag_registry.all())
 
-class RecipeViewSet(viewsets.ModelViewSet):
+    def retrieve(self, request, *args, **kwargs):
+        try:
+            tag = tag_registry.get(int(kwargs['pk']))
+        except ValueError:
+            tag = None
+        if tag is None:
+            raise Http404
+        return Response(tag_registry.represent((tag.id,))[0])
+
+
+def bulk_operation(model, request, invalid=(), on_change=None):
+    """Пакетное добавление (POST) или удаление (DELETE) связей по id.
+
+    Возвращает статус по каждому переданному id.
+    """
+    serializer = BulkIdsSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    ids = list(dict.fromkeys(serializer.validated_data['ids']))
+    if request.method == 'DELETE':
+        changed = bulk.remove_links(model, request.user, ids)
+        results = [
+            {'id': pk, 'status': 'removed' if pk in changed else 'not_found'}
+            for pk in ids]
+    else:
+        changed, existing = bulk.add_links(
+            model, request.user, set(ids) - set(invalid))
+        statuses = {pk: 'invalid' for pk in invalid}
+        statuses.update({pk: 'added' for pk in changed})
+        statuses.update({pk: 'exists' for pk in existing})
+        results = [
+            {'id': pk, 'status': statuses.get(pk, 'not_found')}
+            for pk in ids]
+    if changed and on_change is not None:
+        on_change()
+    return Response(results, status=status.HTTP_200_OK)
+
+
+class RecipeViewSet(AnonymousCacheMixin, SparseFieldsViewMixin,
+                    viewsets.ModelViewSet):
     """Создание/изменение/удаление/вывод рецептов.
        Добавление/удаление - избранное, корзина.
     """
@@ -45,16 +95,107 @@ class RecipeViewSet(viewsets.ModelViewSet):
     queryset = Recipe.objects.all()
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
-    pagination_class = PageNumberLimitPagination
+    pagination_class = PageOrCursorPagination
     permission_classes = (
         IsAuthenticatedOrReadOnly,
         IsAuthorOrReadOnlyPermission)
+    field_presets = {
+        'card': ('id', 'tags', 'author', 'is_favorited',
+                 'is_in_shopping_cart', 'name', 'image', 'cooking_time'),
+    }
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action not in ('list', 'retrieve', 'inventory'):
+            return queryset
+        flags = [flag for flag in ('is_favorited', 'is_in_shopping_cart')
+                 if self.wants(flag)]
+        if self.wants('author'):
+            flags.append('author_is_subscribed')
+        if not self.wants('text'):
+            queryset = queryset.defer('text')
+        return queryset.with_related(
+            author=self.wants('author'),
+            ingredients=self.wants('ingredients'),
+        ).with_user_flags(self.request.user, flags)
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['thumbnails'] = self.action in ('list', 'inventory')
+        return context
 
     def get_serializer_class(self):
         if self.action in ('create', 'update', 'partial_update'):
             return RecipeCreateUpdateSerializer
         return RecipeListSerializer
 
+    @action(
+        detail=False,
+        methods=['get'],
+        pagination_class=PageNumberLimitPagination,
+        url_path='inventory')
+    def inventory(self, request):
+        ingredients = [
+            value for param in request.query_params.getlist('ingredients')
+            for value in param.split(',') if value]
+        params = InventoryQuerySerializer(data={
+            'ingredients': ingredients,
+            **{key: request.query_params[key]
+               for key in ('mode', 'missing') if key in request.query_params},
+        })
+        params.is_valid(raise_exception=True)
+        params = params.validated_data
+        if params['mode'] == 'contains':
+            matches, count_name = inventory_index.containing(
+                params['ingredients']), 'extra'
+        else:
+            matches, count_name = inventory_index.can_make(
+                params['ingredients'], params['missing']), 'missing'
+        page = self.paginate_queryset(matches)
+        recipes = self.get_queryset().in_bulk([pk for pk, _ in page])
+        page = [(recipes[pk], count) for pk, count in page if pk in recipes]
+        data = self.get_serializer(
+            [recipe for recipe, _ in page], many=True).data
+        for item, (_, count) in zip(data, page):
+            item[count_name] = count
+        return self.get_paginated_response(data)
+
+    @action(
+        detail=False,
+        methods=['post'],
+        permission_classes=(IsAuthenticated,),
+        url_path='batch')
+    def batch(self, request):
+        serializer = RecipeCreateUpdateSerializer(
+            data=request.data, many=True, allow_empty=False,
+            max_length=settings.RECIPES_BATCH_MAX_SIZE,
+            context=self.get_serializer_context())
+        serializer.is_valid(raise_exception=True)
+        recipes = serializer.save()
+        return Response(
+            RecipeInSubscribeSerializer(recipes, many=True).data,
+            status=status.HTTP_201_CREATED)
+
+    @action(
+        detail=False,
+        methods=['post', 'delete'],
+        permission_classes=(IsAuthenticated,),
+        url_path='favorite',
+        url_name='favorite-bulk')
+    def favorite_bulk(self, request):
+        return bulk_operation(RecipeInFavorite, request)
+
+    @action(
+        detail=False,
+        methods=['post', 'delete'],
+        permission_classes=(IsAuthenticated,),
+        url_path='shopping_cart',
+        url_name='shopping-cart-bulk')
+    def shopping_cart_bulk(self, request):
+        return bulk_operation(
+            RecipeInShoppingCart, request,
+            on_change=lambda: shopping_cart.bump_version(request.user.id))
+
     @action(
         detail=True,
         methods=['post', 'delete'],
@@ -98,41 +239,24 @@ class RecipeViewSet(viewsets.ModelViewSet):
         detail=False,
         methods=['get'],
         permission_classes=(IsAuthenticated,),
+        renderer_classes=(PDFRenderer, PlainTextRenderer,
+                          CSVRenderer, JSONRenderer),
         url_path='download_shopping_cart')
     def download_shopping_cart(self, request):
-        ingredient_list = RecipeIngredient.objects.filter(
-            recipe__cart__user=request.user
-        ).values(
-            'ingredient__name',
-            'ingredient__measurement_unit').annotate(amount_sum=Sum('amount'))
-
-        pdfmetrics.registerFont(
-            TTFont(
-                'Arial',
-                'static/ttf_arial/ArialRegular.ttf'))
-        buffer = io.BytesIO()
-        p = canvas.Canvas(buffer)
-        p.setFont("Arial", 20)
-        start_cur = 800
-        p.drawString(50, start_cur, 'Shopping list:')
-        start_cur = 770
-        for ingredient in ingredient_list:
-            p.drawString(50, start_cur,
-                         f'{ingredient["ingredient__name"]} -'
-                         f'{ingredient["amount_sum"]} '
-                         f'{ingredient["ingredient__measurement_unit"]}')
-            start_cur -= 30
-            if start_cur <= 0:
-                start_cur = 800
-                p.showPage()
-                p.setFont("Arial", 20)
-
-        p.showPage()
-        p.save()
-
-        buffer.seek(0)
-        return FileResponse(
-            buffer, as_attachment=True, filename='shopping_cart.pdf')
+        export_format = request.accepted_renderer.format
+        if export_format == 'pdf':
+            return HttpResponse(
+                shopping_cart.get_pdf(request.user),
+                content_type='application/pdf',
+                headers={'Content-Disposition':
+                         'attachment; filename="shopping_cart.pdf"'})
+        stream, content_type = shopping_cart.STREAM_FORMATS[export_format]
+        ingredients = shopping_cart.get_ingredients(request.user).iterator()
+        return StreamingHttpResponse(
+            stream(ingredients),
+            content_type=content_type,
+            headers={'Content-Disposition':
+                     f'attachment; filename="shopping_cart.{export_format}"'})
 
 
 class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
@@ -140,16 +264,24 @@ class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
 
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
-    filter_backends = (IngredientFilter, )
-    search_fields = ('^name',)
+    filter_backends = ()
+
+    def list(self, request, *args, **kwargs):
+        name = request.query_params.get('name')
+        if name:
+            return Response(ingredient_index.search(name))
+        return super().list(request, *args, **kwargs)
 
 
-class UserViewSet(UserViewSet):
+class UserViewSet(SparseFieldsViewMixin, UserViewSet):
     """Пользователь. Создание/удаление/вывод подписок."""
 
     queryset = User.objects.all()
     serializer_class = UserSerializer
     pagination_class = PageNumberLimitPagination
+    field_presets = {
+        'card': ('id', 'username', 'first_name', 'last_name'),
+    }
 
     @action(
         detail=False,
@@ -157,9 +289,20 @@ class UserViewSet(UserViewSet):
         permission_classes=(IsAuthenticated,),
         url_path='me')
     def me(self, request):
-        serializer = UserSerializer(request.user)
+        serializer = UserSerializer(
+            request.user, context=self.get_serializer_context())
         return Response(serializer.data, status=status.HTTP_200_OK)
 
+    @action(
+        detail=False,
+        methods=['post', 'delete'],
+        permission_classes=(IsAuthenticated,),
+        url_path='subscribe',
+        url_name='subscribe-bulk')
+    def subscribe_bulk(self, request):
+        return bulk_operation(
+            Subscribe, request, invalid={request.user.id})
+
     @action(
         detail=True,
         methods=['post', 'delete'],
@@ -178,7 +321,8 @@ class UserViewSet(UserViewSet):
 
         serializer = SubscribeCreateSerializer(
             data={'user': user.pk, 'author': author.pk},
-            context={'request': request})
+            context={'request': request,
+                     'recipes_limit': self.recipes_limit()})
         serializer.is_valid(raise_exception=True)
         serializer.save()
         return Response(serializer.data, status=status.HTTP_201_CREATED)
@@ -187,11 +331,54 @@ class UserViewSet(UserViewSet):
         detail=False,
         methods=['get'],
         permission_classes=(IsAuthenticated,),
+        pagination_class=SubscriptionsPagination,
         url_path='subscriptions')
     def subscriptions(self, request):
-        queryset = User.objects.filter(following__user=request.user)
+        limit = self.recipes_limit()
+        queryset = User.objects.filter(
+            following__user=request.user).order_by('id')
         pages = self.paginate_queryset(queryset)
+        for author in pages:
+            author.is_subscribed = True
+        if self.wants('recipes'):
+            self.attach_recipes(pages, limit)
         serializer = SubscribeSerializer(
             pages, many=True,
-            context={'request': request})
+            context=self.get_serializer_context())
         return self.get_paginated_response(serializer.data)
+
+    @action(
+        detail=False,
+        methods=['get'],
+        permission_classes=(IsAuthenticated,),
+        pagination_class=FeedPagination,
+        url_path='feed')
+    def feed(self, request):
+        flags = [flag for flag in ('is_favorited', 'is_in_shopping_cart')
+                 if self.wants(flag)]
+        if self.wants('author'):
+            flags.append('author_is_subscribed')
+        queryset = Recipe.objects.with_related(
+            author=self.wants('author'),
+            ingredients=self.wants('ingredients'),
+        ).with_user_flags(request.user, flags)
+        pages = self.paginate_queryset(queryset)
+        serializer = RecipeListSerializer(
+            pages, many=True,
+            context={**self.get_serializer_context(), 'thumbnails': True})
+        return self.get_paginated_response(serializer.data)
+
+    def recipes_limit(self):
+        params = RecipesLimitSerializer(data=self.request.query_params)
+        params.is_valid(raise_exception=True)
+        return params.validated_data.get('recipes_limit')
+
+    def attach_recipes(self, authors, limit):
+        recipes = Recipe.objects.filter(author__in=authors)
+        if limit is not None:
+            recipes = recipes.limited_per_author(limit)
+        author_recipes = defaultdict(list)
+        for recipe in recipes:
+            author_recipes[recipe.author_id].append(recipe)
+        for author in authors:
+            author.limited_recipes = author_recipes[author.id]
@@ -0,0 +1,10 @@
+from django.contrib import admin
+
+from .paginators import EstimatedCountPaginator
+
+
+class ScalableAdmin(admin.ModelAdmin):
+    """Базовая админка для больших таблиц."""
+
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
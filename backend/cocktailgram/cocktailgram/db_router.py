@@ -0,0 +1,173 @@
+import asyncio
+import random
+import time
+from contextvars import ContextVar
+from hashlib import md5
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core.signals import request_started
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from django.dispatch import receiver
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+read_alias = ContextVar('read_alias', default=None)
+replicas_down = {}
+
+
+def pin_key(name):
+    return f'db_pin:{md5(name.encode()).hexdigest()}'
+
+
+def pin(*names):
+    """Чтение по этим ключам идёт с primary, пока реплики догоняют."""
+    if not settings.DATABASE_REPLICAS:
+        return
+    cache.set_many(
+        {pin_key(name): True for name in names},
+        settings.REPLICA_PIN_SECONDS)
+
+
+def is_pinned(*names):
+    return bool(cache.get_many([pin_key(name) for name in names]))
+
+
+def client_keys(request):
+    """Ключи закрепления клиента: заголовок Authorization или сессия."""
+    credentials = (request.META.get('HTTP_AUTHORIZATION')
+                   or request.COOKIES.get(settings.SESSION_COOKIE_NAME))
+    return [f'auth:{credentials}'] if credentials else []
+
+
+def mark_down(alias):
+    replicas_down[alias] = time.monotonic() + settings.REPLICA_RETRY_SECONDS
+
+
+def choose_replica():
+    """Случайная доступная реплика; недоступные пропускаются на время."""
+    for alias in random.sample(
+            settings.DATABASE_REPLICAS, len(settings.DATABASE_REPLICAS)):
+        if alias in replicas_down:
+            continue
+        try:
+            connections[alias].ensure_connection()
+        except DatabaseError:
+            mark_down(alias)
+            continue
+        return alias
+    return None
+
+
+class ReplicaRouter:
+    """Чтение с реплики, если его разрешил ReplicaMiddleware.
+
+    Запись, миграции, чтение внутри транзакции и поиск токенов идут на
+    primary: только что выданный при входе токен на реплике может ещё
+    не появиться.
+    """
+
+    primary_models = ('authtoken.token',)
+
+    def db_for_read(self, model, **hints):
+        alias = read_alias.get()
+        if (alias is None
+                or model._meta.label_lower in self.primary_models
+                or connections[DEFAULT_DB_ALIAS].in_atomic_block):
+            return DEFAULT_DB_ALIAS
+        return alias
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+class ReplicaMiddleware:
+    """Отправляет безопасные запросы к API на реплики.
+
+    После запроса с записью клиент (по токену или сессии) на
+    REPLICA_PIN_SECONDS закрепляется за primary, чтобы сразу видеть свои
+    изменения. Анонимное чтение рецептов после любого изменения рецептов
+    тоже идёт с primary: иначе в кэш ответов попадёт отставшая реплика.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            # Как в MiddlewareMixin: под ASGI экземпляр - корутина.
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        keys = client_keys(request)
+        alias = self.choose(request, keys) if self.eligible(request) else None
+        token = read_alias.set(alias)
+        try:
+            response = self.get_response(request)
+        finally:
+            read_alias.reset(token)
+        if request.method not in SAFE_METHODS and keys:
+            pin(*keys)
+        return response
+
+    async def __acall__(self, request):
+        # Кэш и проверка реплики блокируют: уносим их в пул потоков,
+        # чтобы не держать цикл событий и общий синхронный поток.
+        keys = client_keys(request)
+        alias = None
+        if self.eligible(request):
+            alias = await sync_to_async(
+                self.choose, thread_sensitive=False)(request, keys)
+        token = read_alias.set(alias)
+        try:
+            response = await self.get_response(request)
+        finally:
+            read_alias.reset(token)
+        if request.method not in SAFE_METHODS and keys:
+            await sync_to_async(pin, thread_sensitive=False)(*keys)
+        return response
+
+    def eligible(self, request):
+        return bool(settings.DATABASE_REPLICAS
+                    and request.method in SAFE_METHODS
+                    and request.path.startswith(settings.REPLICA_PATHS))
+
+    def choose(self, request, keys):
+        return None if self.pinned(request, keys) else choose_replica()
+
+    def pinned(self, request, keys):
+        if ('HTTP_AUTHORIZATION' not in request.META
+                and request.path.startswith('/api/recipes/')):
+            keys = (*keys, 'recipes')
+        return is_pinned(*keys)
+
+
+@receiver(request_started)
+def check_replicas(**kwargs):
+    """Повторная проверка упавших реплик после REPLICA_RETRY_SECONDS.
+
+    Исправные соединения перед запросом не проверяются: соединение,
+    на котором была ошибка, Django сам закрывает в конце запроса.
+    """
+    now = time.monotonic()
+    for alias, retry_at in list(replicas_down.items()):
+        if retry_at > now:
+            continue
+        conn = connections[alias]
+        conn.close()
+        try:
+            conn.ensure_connection()
+        except DatabaseError:
+            mark_down(alias)
+        else:
+            replicas_down.pop(alias, None)
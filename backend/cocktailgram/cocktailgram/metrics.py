@@ -0,0 +1,360 @@
+import asyncio
+import logging
+import os
+import socket
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.http import HttpResponse, HttpResponseForbidden
+
+logger = logging.getLogger(__name__)
+
+current_stats = ContextVar('current_stats', default=None)
+
+DURATION_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+SIZE_BUCKETS = (1024, 10_240, 102_400, 1_048_576, 10_485_760)
+
+HISTOGRAMS = {
+    'http_request_duration_seconds': (
+        'Время обработки запроса', DURATION_BUCKETS),
+    'http_request_db_seconds': (
+        'Время SQL-запросов за запрос', DURATION_BUCKETS),
+    'http_request_db_queries': (
+        'Число SQL-запросов за запрос', QUERY_BUCKETS),
+    'http_request_serialize_seconds': (
+        'Время сериализации ответа', DURATION_BUCKETS),
+    'http_request_render_seconds': (
+        'Время отрисовки ответа рендерером', DURATION_BUCKETS),
+    'http_response_size_bytes': (
+        'Размер ответа', SIZE_BUCKETS),
+}
+
+PROCESSES_KEY = 'metrics:processes'
+HOST = socket.gethostname()
+
+# Метод и действие попадают в метки, поэтому набор значений ограничен.
+METHODS = ('GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS')
+
+
+class RequestStats:
+    """Счётчики одного запроса; SQL могут выполняться в разных потоках."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.view = 'unresolved'
+        self.queries = 0
+        self.db_time = 0.0
+        self.serializing = False
+        self.serialize_time = None
+        self.render_started = None
+        self.render_time = None
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - started
+            with self.lock:
+                self.queries += 1
+                self.db_time += duration
+            if duration * 1000 >= settings.SLOW_QUERY_MS:
+                logger.warning(
+                    'Медленный запрос %.0f мс в %s: %s',
+                    duration * 1000, self.view, sql[:1000])
+
+
+def account_query(execute, sql, params, many, context):
+    stats = current_stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    return stats(execute, sql, params, many, context)
+
+
+def instrument(connection):
+    if account_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(account_query)
+
+
+@receiver(connection_created)
+def connection_opened(sender, connection, **kwargs):
+    instrument(connection)
+
+
+def method_label(method):
+    return method if method in METHODS else 'other'
+
+
+def view_name(view_func, method):
+    """Имя представления для меток: RecipeViewSet.list и т. п."""
+    cls = getattr(view_func, 'cls', None)
+    if cls is None:
+        return getattr(view_func, '__qualname__', repr(view_func))
+    actions = getattr(view_func, 'actions', None) or {}
+    return f'{cls.__name__}.{actions.get(method.lower(), "unresolved")}'
+
+
+class Registry:
+    """Гистограммы по представлениям в памяти процесса.
+
+    Раз в METRICS_PUBLISH_SECONDS процесс кладёт свой снимок в общий кэш,
+    эндпоинт метрик отдаёт снимки всех процессов отдельными рядами с
+    метками host и pid: сумма счётчиков упала бы после перезапуска
+    воркера. С LocMemCache виден только обслуживший запрос процесс.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = {}
+        self.requests = {}
+        self.published = 0.0
+
+    @property
+    def key(self):
+        # pid берётся при публикации: воркеры gunicorn с --preload
+        # получают реестр от мастера через fork.
+        return f'metrics:{HOST}:{os.getpid()}'
+
+    def observe(self, labels, status, values):
+        with self.lock:
+            request_key = (*labels, str(status))
+            self.requests[request_key] = self.requests.get(request_key, 0) + 1
+            for name, value in values.items():
+                if value is None:
+                    continue
+                buckets = HISTOGRAMS[name][1]
+                state = self.histograms.get((name, labels))
+                if state is None:
+                    state = [0] * (len(buckets) + 3)
+                    self.histograms[name, labels] = state
+                state[bisect_left(buckets, value)] += 1
+                state[-2] += value
+                state[-1] += 1
+        elapsed = time.monotonic() - self.published
+        if elapsed > settings.METRICS_PUBLISH_SECONDS:
+            self.publish()
+
+    def snapshot(self):
+        with self.lock:
+            return (
+                {key: list(state) for key, state in self.histograms.items()},
+                dict(self.requests))
+
+    def publish(self):
+        self.published = time.monotonic()
+        key = self.key
+        cache.set(key, ((('host', HOST), ('pid', os.getpid())),
+                        *self.snapshot()), settings.METRICS_TTL)
+        processes = cache.get(PROCESSES_KEY) or set()
+        if key not in processes:
+            cache.set(PROCESSES_KEY, processes | {key}, None)
+
+    def collect(self):
+        """Снимки всех живых процессов: (метки процесса, гистограммы,
+        запросы).
+        """
+        self.publish()
+        processes = cache.get(PROCESSES_KEY) or {self.key}
+        snapshots = cache.get_many(processes)
+        if snapshots.keys() != processes:
+            cache.set(PROCESSES_KEY, set(snapshots), None)
+        return [snapshots[key] for key in sorted(snapshots)]
+
+
+registry = Registry()
+
+
+def label_value(value):
+    return str(value).replace('\\', '\\\\').replace(
+        '"', '\\"').replace('\n', '\\n')
+
+
+def label_text(labels):
+    return ','.join(
+        f'{name}="{label_value(value)}"' for name, value in labels)
+
+
+def exposition():
+    """Метрики в текстовом формате Prometheus."""
+    processes = registry.collect()
+    lines = [
+        '# HELP http_requests_total Число запросов',
+        '# TYPE http_requests_total counter',
+    ]
+    for process, _, requests in processes:
+        for (view, method, status), count in sorted(requests.items()):
+            labels = label_text((
+                ('view', view), ('method', method), ('status', status),
+                *process))
+            lines.append(f'http_requests_total{{{labels}}} {count}')
+    for name, (help_text, buckets) in HISTOGRAMS.items():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} histogram')
+        series = sorted(
+            (labels, process, state)
+            for process, histograms, _ in processes
+            for (metric, labels), state in histograms.items()
+            if metric == name)
+        for (view, method), process, state in series:
+            labels = label_text(
+                (('view', view), ('method', method), *process))
+            cumulative = 0
+            for bound, count in zip((*buckets, '+Inf'), state[:-2]):
+                cumulative += count
+                lines.append(
+                    f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'{name}_sum{{{labels}}} {state[-2]}')
+            lines.append(f'{name}_count{{{labels}}} {state[-1]}')
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_view(request):
+    """Эндпоинт для Prometheus по Bearer-токену METRICS_TOKEN.
+
+    Без токена метрики отдаются только при DEBUG.
+    """
+    token = settings.METRICS_TOKEN
+    if not token and not settings.DEBUG:
+        return HttpResponseForbidden()
+    if token and request.META.get(
+            'HTTP_AUTHORIZATION') != f'Bearer {token}':
+        return HttpResponseForbidden()
+    return HttpResponse(
+        exposition(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+@contextmanager
+def serializing():
+    """Учёт времени сериализации; вложенные сериализаторы входят во
+    время внешнего и отдельно не суммируются.
+    """
+    stats = current_stats.get()
+    if stats is None or stats.serializing:
+        yield
+        return
+    stats.serializing = True
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats.serializing = False
+        stats.serialize_time = (
+            (stats.serialize_time or 0) + time.perf_counter() - started)
+
+
+def timed_render(response):
+    """Отрисовка ответа с учётом её времени в статистике запроса."""
+    stats = current_stats.get()
+    started = time.perf_counter()
+    response.render()
+    if stats is not None:
+        stats.render_time = time.perf_counter() - started
+    return response
+
+
+class PerformanceMiddleware:
+    """Число и время SQL-запросов, время сериализации и отрисовки, размер
+    ответа.
+
+    Сериализация - to_representation сериализаторов с TimedSerializerMixin
+    (вместе с запросами загрузчиков), отрисовка - render() ответа
+    рендерером DRF.
+    Результаты уходят в заголовок Server-Timing (при SERVER_TIMING), в
+    журнал для медленных запросов и в гистограммы по представлениям
+    (metrics_view). SQL считаются обёрткой execute_wrapper на каждом
+    соединении, поэтому учитываются и запросы из пулов потоков
+    асинхронных представлений.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            # Как в MiddlewareMixin: под ASGI экземпляр - корутина.
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+        for connection in connections.all():
+            instrument(connection)
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        started = time.perf_counter()
+        stats = RequestStats()
+        token = current_stats.set(stats)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_stats.reset(token)
+        return self.finish(request, response, stats, started)
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        stats = RequestStats()
+        token = current_stats.set(stats)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_stats.reset(token)
+        return self.finish(request, response, stats, started)
+
+    def finish(self, request, response, stats, started):
+        total = time.perf_counter() - started
+        size = None if response.streaming else len(response.content)
+        method = method_label(request.method)
+        registry.observe((stats.view, method), response.status_code, {
+            'http_request_duration_seconds': total,
+            'http_request_db_seconds': stats.db_time,
+            'http_request_db_queries': stats.queries,
+            'http_request_serialize_seconds': stats.serialize_time,
+            'http_request_render_seconds': stats.render_time,
+            'http_response_size_bytes': size,
+        })
+        if settings.SERVER_TIMING:
+            response['Server-Timing'] = self.server_timing(stats, total)
+        if total * 1000 >= settings.SLOW_REQUEST_MS:
+            logger.warning(
+                'Медленный запрос %s %s (%s): %.0f мс, SQL: %d за %.0f мс, '
+                'ответ %s байт', request.method, request.path, stats.view,
+                total * 1000, stats.queries, stats.db_time * 1000, size)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        current_stats.get().view = view_name(view_func, request.method)
+
+    def process_template_response(self, request, response):
+        if response.is_rendered:
+            # Асинхронные представления отрисовывают ответ в своём потоке
+            # через timed_render.
+            return response
+        stats = current_stats.get()
+        stats.render_started = time.perf_counter()
+
+        def rendered(response):
+            stats.render_time = time.perf_counter() - stats.render_started
+
+        response.add_post_render_callback(rendered)
+        return response
+
+    def server_timing(self, stats, total):
+        metrics = [
+            f'db;dur={stats.db_time * 1000:.1f};'
+            f'desc="{stats.queries} queries"']
+        if stats.serialize_time is not None:
+            metrics.append(
+                f'serialize;dur={stats.serialize_time * 1000:.1f}')
+        if stats.render_time is not None:
+            metrics.append(f'render;dur={stats.render_time * 1000:.1f}')
+        metrics.append(f'total;dur={total * 1000:.1f}')
+        return ', '.join(metrics)
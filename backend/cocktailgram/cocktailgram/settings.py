@@ -31,6 +31,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'cocktailgram.metrics.PerformanceMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -38,6 +39,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'cocktailgram.db_router.ReplicaMiddleware',
 ]
 
 ROOT_URLCONF = 'cocktailgram.urls'
@@ -63,26 +65,55 @@ TEMPLATES = [
 WSGI_APPLICATION = 'cocktailgram.wsgi.application'
 
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.postgresql',
-        'NAME': os.getenv('POSTGRES_DB', 'django'),
-        'USER': os.getenv('POSTGRES_USER', 'django'),
-        'PASSWORD': os.getenv('POSTGRES_PASSWORD', ''),
-        'HOST': os.getenv('DB_HOST', ''),
-        'PORT': os.getenv('DB_PORT', 5432)
+# DB_ENGINE=sqlite3 - разработка и бенчмарки без PostgreSQL.
+DB_ENGINE = os.getenv('DB_ENGINE', 'postgresql')
+
+if DB_ENGINE == 'sqlite3':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.getenv('SQLITE_PATH', BASE_DIR / 'db.sqlite3'),
+        }
+    }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': f'django.db.backends.{DB_ENGINE}',
+            'NAME': os.getenv('POSTGRES_DB', 'django'),
+            'USER': os.getenv('POSTGRES_USER', 'django'),
+            'PASSWORD': os.getenv('POSTGRES_PASSWORD', ''),
+            'HOST': os.getenv('DB_HOST', ''),
+            'PORT': os.getenv('DB_PORT', 5432),
+            'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', 60)),
+        }
     }
-}
 
-AUTH_USER_MODEL = "users.User"
+# Реплики для чтения: DB_REPLICA_HOSTS="host1 host2:5433"
+for index, replica in enumerate(os.getenv('DB_REPLICA_HOSTS', '').split()):
+    host, _, port = replica.partition(':')
+    DATABASES[f'replica_{index}'] = {
+        **DATABASES['default'],
+        'HOST': host,
+        'PORT': port or DATABASES['default'].get('PORT', ''),
+        'TEST': {'MIRROR': 'default'},
+    }
 
-# DATABASES = {
-#     'default': {
-#         'ENGINE': 'django.db.backends.sqlite3',
-#         'NAME': BASE_DIR / 'db.sqlite3',
-#     }
-# }
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['cocktailgram.db_router.ReplicaRouter']
+REPLICA_PATHS = (
+    '/api/recipes/', '/api/ingredients/', '/api/tags/', '/api/users/')
+REPLICA_PIN_SECONDS = int(os.getenv('REPLICA_PIN_SECONDS', 5))
+REPLICA_RETRY_SECONDS = int(os.getenv('REPLICA_RETRY_SECONDS', 30))
 
+AUTH_USER_MODEL = "users.User"
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    }
+}
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -117,6 +148,22 @@ STATIC_ROOT = BASE_DIR / 'collected_static'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = '/media/'
 
+RECIPE_IMAGE_MAX_SIZE = int(os.getenv('RECIPE_IMAGE_MAX_SIZE', 5 * 1024 ** 2))
+RECIPE_THUMBNAIL_SIZE = (480, 480)
+IMAGE_WORKERS = int(os.getenv('IMAGE_WORKERS', 2))
+RECIPES_BATCH_MAX_SIZE = int(os.getenv('RECIPES_BATCH_MAX_SIZE', 100))
+BULK_IDS_MAX_SIZE = int(os.getenv('BULK_IDS_MAX_SIZE', 1000))
+
+# Лента подписок: рецепты авторов с большим числом подписчиков не
+# раскладываются по лентам при записи, а подтягиваются при чтении
+FEED_FANOUT_LIMIT = int(os.getenv('FEED_FANOUT_LIMIT', 10_000))
+FEED_BACKFILL_SIZE = int(os.getenv('FEED_BACKFILL_SIZE', 100))
+
+# Асинхронные обработчики API под ASGI (compose.asgi.yml)
+ASYNC_VIEWS = os.getenv('ASYNC_VIEWS', 'False').lower() == 'true'
+ASYNC_VIEW_WORKERS = int(os.getenv('ASYNC_VIEW_WORKERS', 32))
+ASYNC_QUERY_WORKERS = int(os.getenv('ASYNC_QUERY_WORKERS', 8))
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 
@@ -138,12 +185,35 @@ REST_FRAMEWORK = {
     ],
 
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
     ],
 
     'DEFAULT_FILTER_BACKENDS': ['django_filters.rest_framework.DjangoFilterBackend'],
 }
 
+# Кэш токенов: LRU в процессе и, при TOKEN_CACHE_SHARED, общий кэш
+TOKEN_CACHE_SIZE = int(os.getenv('TOKEN_CACHE_SIZE', 10_000))
+TOKEN_CACHE_TTL = int(os.getenv('TOKEN_CACHE_TTL', 300))
+TOKEN_CACHE_SHARED = os.getenv('TOKEN_CACHE_SHARED', 'False').lower() == 'true'
+
+# Конфигурация полнотекстового поиска PostgreSQL
+SEARCH_CONFIG = os.getenv('SEARCH_CONFIG', 'russian')
+
+RECIPES_CACHE_TIMEOUT = int(os.getenv('RECIPES_CACHE_TIMEOUT', 60 * 10))
+RECIPES_CACHE_MAX_AGE = int(os.getenv('RECIPES_CACHE_MAX_AGE', 60))
+
+# Замеры запросов: Server-Timing, журнал медленных запросов, /metrics
+SERVER_TIMING = os.getenv('SERVER_TIMING', 'False').lower() == 'true'
+SLOW_REQUEST_MS = int(os.getenv('SLOW_REQUEST_MS', 1000))
+SLOW_QUERY_MS = int(os.getenv('SLOW_QUERY_MS', 200))
+# Без токена /metrics отвечает только при DEBUG.
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+METRICS_PUBLISH_SECONDS = int(os.getenv('METRICS_PUBLISH_SECONDS', 15))
+METRICS_TTL = int(os.getenv('METRICS_TTL', 60 * 60))
+
+PAGINATION_COUNT_CACHE_TIMEOUT = int(
+    os.getenv('PAGINATION_COUNT_CACHE_TIMEOUT', 0))
+
 DJOSER = {
 
     'HIDE_USERS': False,
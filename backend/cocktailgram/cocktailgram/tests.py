@@ -0,0 +1,120 @@
+import asyncio
+import time
+from contextlib import ExitStack
+from unittest import skipUnless
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.http import HttpResponse
+from django.test import (
+    AsyncClient, SimpleTestCase, TestCase, TransactionTestCase,
+    override_settings)
+from django.test.utils import CaptureQueriesContext
+from django.urls import path
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from recipes.models import Recipe
+from users.models import User
+from .db_router import replicas_down
+from .metrics import registry
+
+REPLICA = 'replica_0'
+DELAY = 0.2
+
+
+async def slow_view(request):
+    await asyncio.sleep(DELAY)
+    return HttpResponse()
+
+
+urlpatterns = [path('slow/', slow_view)]
+
+
+@skipUnless(REPLICA in settings.DATABASES,
+            'Нужна реплика: задайте DB_REPLICA_HOSTS')
+class ReplicaRoutingTests(TransactionTestCase):
+    """Маршрутизация чтения на реплику - зеркало default в тестах.
+
+    TransactionTestCase: реплика ходит в базу своим соединением и не
+    видит данных из незакрытой транзакции TestCase.
+    """
+
+    databases = {'default', REPLICA} & settings.DATABASES.keys()
+
+    def setUp(self):
+        cache.clear()
+        replicas_down.clear()
+        self.addCleanup(replicas_down.clear)
+        user = User.objects.create_user(
+            username='reader', email='reader@example.com')
+        self.client = APIClient()
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=user)}')
+
+    def read_aliases(self, path='/api/recipes/'):
+        """Алиасы, на которых выполнялись SELECT во время запроса."""
+        with ExitStack() as stack:
+            contexts = {
+                alias: stack.enter_context(
+                    CaptureQueriesContext(connections[alias]))
+                for alias in ('default', REPLICA)}
+            self.assertEqual(self.client.get(path).status_code, 200)
+        return {
+            alias for alias, context in contexts.items()
+            if any('recipes_recipe' in query['sql']
+                   for query in context.captured_queries)}
+
+    def test_safe_request_reads_from_replica(self):
+        self.assertEqual(self.read_aliases(), {REPLICA})
+
+    def test_write_pins_client_to_primary(self):
+        self.client.post('/api/recipes/', {}, format='json')
+        self.assertEqual(self.read_aliases(), {'default'})
+
+    def test_failed_replica_is_skipped_until_retry(self):
+        replicas_down[REPLICA] = time.monotonic() + 60
+        self.assertEqual(self.read_aliases(), {'default'})
+        replicas_down[REPLICA] = time.monotonic() - 1
+        self.assertEqual(self.read_aliases(), {REPLICA})
+        self.assertNotIn(REPLICA, replicas_down)
+
+
+@override_settings(ROOT_URLCONF=__name__)
+class AsgiConcurrencyTests(SimpleTestCase):
+    """Под ASGI цепочка middleware не сводит запросы в один поток."""
+
+    async def test_requests_overlap(self):
+        client = AsyncClient()
+        started = time.perf_counter()
+        responses = await asyncio.gather(
+            *(client.get('/slow/') for _ in range(4)))
+        elapsed = time.perf_counter() - started
+        self.assertEqual(
+            [response.status_code for response in responses], [200] * 4)
+        self.assertLess(elapsed, DELAY * 2)
+
+
+@override_settings(SERVER_TIMING=True, DATABASE_REPLICAS=[])
+class ServerTimingTests(TestCase):
+    """Время сериализации выводится отдельно от отрисовки."""
+
+    def test_serialize_timing(self):
+        cache.clear()
+        author = User.objects.create_user(
+            username='author', email='author@example.com')
+        Recipe.objects.create(
+            author=author, name='Рецепт', text='Текст',
+            image='images/recipe.png')
+
+        response = self.client.get('/api/recipes/')
+
+        self.assertEqual(response.status_code, 200)
+        timings = [metric.split(';')[0]
+                   for metric in response['Server-Timing'].split(', ')]
+        self.assertEqual(timings, ['db', 'serialize', 'render', 'total'])
+        histograms, _ = registry.snapshot()
+        self.assertIn(
+            ('http_request_serialize_seconds', ('RecipeViewSet.list', 'GET')),
+            histograms)
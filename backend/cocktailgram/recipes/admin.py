@@ -1,14 +1,15 @@
 from django.contrib import admin
 
+from cocktailgram.admin import ScalableAdmin
 from .models import (
     Tag, Ingredient, Recipe, RecipeInFavorite,
     RecipeInShoppingCart, RecipeIngredient)
 
 
 @admin.register(Ingredient)
-class IngredientAdmin(admin.ModelAdmin):
+class IngredientAdmin(ScalableAdmin):
     list_display = ('name', 'measurement_unit',)
-    list_filter = ('name',)
+    search_fields = ('name',)
 
 
 @admin.register(Tag)
@@ -17,24 +18,33 @@ class TagAdmin(admin.ModelAdmin):
 
 
 @admin.register(Recipe)
-class RecipeAdmin(admin.ModelAdmin):
-    list_display = ('author', 'name', 'favorite_count')
-    list_filter = ('name', 'author', 'tags',)
-
-    def favorite_count(self, instance):
-        return instance.favorites.count()
+class RecipeAdmin(ScalableAdmin):
+    list_display = (
+        'author', 'name', 'favorites_count', 'in_carts_count', 'pub_date')
+    list_select_related = ('author',)
+    list_filter = ('tags',)
+    search_fields = ('name',)
+    autocomplete_fields = ('author',)
+    readonly_fields = ('favorites_count', 'in_carts_count')
 
 
 @admin.register(RecipeIngredient)
-class RecipeIngredientAdmin(admin.ModelAdmin):
+class RecipeIngredientAdmin(ScalableAdmin):
     list_display = ('recipe', 'ingredient', 'amount')
+    list_select_related = ('recipe__author', 'ingredient')
+    raw_id_fields = ('recipe',)
+    autocomplete_fields = ('ingredient',)
 
 
 @admin.register(RecipeInShoppingCart)
-class RecipeInShoppingCartAdmin(admin.ModelAdmin):
+class RecipeInShoppingCartAdmin(ScalableAdmin):
     list_display = ('user', 'recipe',)
+    list_select_related = ('user', 'recipe__author')
+    raw_id_fields = ('user', 'recipe')
 
 
 @admin.register(RecipeInFavorite)
-class RecipeInFavoriteAdmin(admin.ModelAdmin):
+class RecipeInFavoriteAdmin(ScalableAdmin):
     list_display = ('user', 'recipe',)
+    list_select_related = ('user', 'recipe__author')
+    raw_id_fields = ('user', 'recipe')
@@ -0,0 +1,276 @@
+import csv
+import io
+from collections import defaultdict
+from itertools import islice
+
+from django.db import connection, connections, router, transaction
+
+from users.models import Subscribe, User
+from . import feed
+from .counters import COUNTERS, increment, rebuild_user_counters
+from .models import Ingredient, Recipe, RecipeIngredient, Tag
+from .search import update_search_vectors
+
+
+def iter_chunks(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def import_ingredients(rows, batch_size):
+    """Ингредиенты пачками, уже существующие пропускаются."""
+    for chunk in iter_chunks(rows, batch_size):
+        Ingredient.objects.bulk_create(
+            (Ingredient(name=row['name'],
+                        measurement_unit=row['measurement_unit'])
+             for row in chunk),
+            batch_size=batch_size, ignore_conflicts=True)
+        yield len(chunk)
+
+
+def copy_ingredients(rows, batch_size):
+    """Ингредиенты через COPY во временную таблицу (PostgreSQL).
+
+    Строки копируются пачками, а в основную таблицу переносятся одним
+    INSERT ... ON CONFLICT DO NOTHING в той же транзакции.
+    """
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            'CREATE TEMP TABLE import_ingredient '
+            '(name varchar(256), measurement_unit varchar(100)) '
+            'ON COMMIT DROP')
+        for chunk in iter_chunks(rows, batch_size):
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerows(
+                (row['name'], row['measurement_unit']) for row in chunk)
+            buffer.seek(0)
+            cursor.copy_expert(
+                'COPY import_ingredient FROM STDIN WITH (FORMAT csv)',
+                buffer)
+            yield len(chunk)
+        cursor.execute(
+            'INSERT INTO recipes_ingredient (name, measurement_unit) '
+            'SELECT DISTINCT name, measurement_unit FROM import_ingredient '
+            'ON CONFLICT DO NOTHING')
+
+
+def import_tags(rows, batch_size):
+    """Теги пачками, уже существующие пропускаются."""
+    for chunk in iter_chunks(rows, batch_size):
+        Tag.objects.bulk_create(
+            (Tag(name=row['name'], slug=row['slug'], color=row['color'])
+             for row in chunk),
+            batch_size=batch_size, ignore_conflicts=True)
+        yield len(chunk)
+
+
+RECIPE_FIELDS = ('author', 'name', 'text', 'cooking_time', 'image',
+                 'tags', 'ingredients')
+NAME_MAX_LENGTH = Recipe._meta.get_field('name').max_length
+TEXT_MAX_LENGTH = Recipe._meta.get_field('text').max_length
+# Верхние границы PositiveSmallIntegerField и ключей на всех СУБД.
+SMALL_INTEGER_MAX = 32767
+ID_MAX = 2 ** 31 - 1
+
+
+def is_integer(value, maximum=SMALL_INTEGER_MAX):
+    return (isinstance(value, int) and not isinstance(value, bool)
+            and 1 <= value <= maximum)
+
+
+def is_text(value, max_length=None):
+    return (isinstance(value, str) and value.strip() != ''
+            and (max_length is None or len(value) <= max_length))
+
+
+def check_recipe(row):
+    """Ошибка в полях рецепта без запросов к базе или None."""
+    if not isinstance(row, dict):
+        return 'Рецепт должен быть объектом.'
+    missing = [field for field in RECIPE_FIELDS if field not in row]
+    if missing:
+        return f'Нет полей: {", ".join(missing)}.'
+    if not is_text(row['author']):
+        return 'Автор задаётся email.'
+    if not is_text(row['name'], NAME_MAX_LENGTH):
+        return f'Название - от 1 до {NAME_MAX_LENGTH} символов.'
+    if not is_text(row['text'], TEXT_MAX_LENGTH):
+        return f'Описание - от 1 до {TEXT_MAX_LENGTH} символов.'
+    if not is_text(row['image']):
+        return 'Нет изображения.'
+    if not is_integer(row['cooking_time']):
+        return f'Время приготовления - от 1 до {SMALL_INTEGER_MAX} минут.'
+    if (not isinstance(row['tags'], list)
+            or not all(is_text(slug) for slug in row['tags'])):
+        return 'Теги задаются списком slug.'
+    ingredients = row['ingredients']
+    if not isinstance(ingredients, list) or not all(
+            isinstance(item, dict) and is_integer(item.get('id'), ID_MAX)
+            for item in ingredients):
+        return 'Ингредиенты задаются списком id и количеств.'
+    if not all(is_integer(item.get('amount')) for item in ingredients):
+        return f'Количество ингредиента - от 1 до {SMALL_INTEGER_MAX}!'
+    return None
+
+
+def prepare_recipes(rows):
+    """Проверка пачки рецептов несколькими запросами на всю пачку.
+
+    Возвращает рецепты, готовые к вставке, и ошибки по номерам строк.
+    Автор задаётся email, теги - slug, ингредиенты - id и количеством.
+    Строки с некорректными полями попадают в ошибки до запросов к базе.
+    """
+    checked, errors = [], []
+    for index, row in enumerate(rows):
+        error = check_recipe(row)
+        if error is None:
+            checked.append((index, row))
+        else:
+            errors.append((index, error))
+    rows = [row for _, row in checked]
+    authors = dict(User.objects.filter(
+        email__in={row['author'] for row in rows}
+    ).values_list('email', 'id'))
+    tags = dict(Tag.objects.filter(
+        slug__in={slug for row in rows for slug in row['tags']}
+    ).values_list('slug', 'id'))
+    ingredients = set(Ingredient.objects.filter(
+        id__in={item['id'] for row in rows for item in row['ingredients']}
+    ).values_list('id', flat=True))
+    existing = set(Recipe.objects.filter(
+        author_id__in=authors.values(),
+        name__in={row['name'] for row in rows}
+    ).values_list('author_id', 'name'))
+
+    valid = []
+    for index, row in checked:
+        author_id = authors.get(row['author'])
+        ingredient_ids = [item['id'] for item in row['ingredients']]
+        if author_id is None:
+            errors.append((index, f'Автор {row["author"]} не найден.'))
+        elif (author_id, row['name']) in existing:
+            errors.append((index, f'Рецепт {row["name"]} уже существует.'))
+        elif not row['tags'] or set(row['tags']) - tags.keys():
+            errors.append((index, 'Неизвестные или пустые теги.'))
+        elif not ingredient_ids or set(ingredient_ids) - ingredients:
+            errors.append((index, 'Неизвестные или пустые ингредиенты.'))
+        elif len(set(ingredient_ids)) != len(ingredient_ids):
+            errors.append((index, 'Ингредиенты не могут повторяться!'))
+        else:
+            existing.add((author_id, row['name']))
+            valid.append({
+                **row,
+                'author': author_id,
+                'tags': {tags[slug] for slug in row['tags']},
+            })
+    return valid, sorted(errors)
+
+
+@transaction.atomic
+def create_recipes(rows):
+    """Вставка проверенных рецептов и их связей тремя bulk-запросами."""
+    recipes = [
+        Recipe(author_id=row['author'], name=row['name'], text=row['text'],
+               cooking_time=row['cooking_time'], image=row['image'])
+        for row in rows]
+    Recipe.objects.bulk_create(recipes)
+    if any(recipe.pk is None for recipe in recipes):
+        # Без RETURNING id подбираются по (автор, название) по порядку:
+        # названия не уникальны, но строки пачки вставлены последними.
+        pending = defaultdict(list)
+        for recipe in recipes:
+            pending[recipe.author_id, recipe.name].append(recipe)
+        for pk, author_id, name in Recipe.objects.filter(
+                author_id__in={recipe.author_id for recipe in recipes},
+                name__in={recipe.name for recipe in recipes}
+        ).order_by('-pk').values_list('pk', 'author_id', 'name'):
+            same = pending.get((author_id, name))
+            if same:
+                same.pop().pk = pk
+    Recipe.tags.through.objects.bulk_create(
+        Recipe.tags.through(recipe_id=recipe.pk, tag_id=tag_id)
+        for recipe, row in zip(recipes, rows) for tag_id in row['tags'])
+    RecipeIngredient.objects.bulk_create(
+        RecipeIngredient(recipe_id=recipe.pk, ingredient_id=item['id'],
+                         amount=item['amount'])
+        for recipe, row in zip(recipes, rows)
+        for item in row['ingredients'])
+    rebuild_user_counters(User.objects.filter(
+        pk__in={recipe.author_id for recipe in recipes}))
+    update_search_vectors(Recipe.objects.filter(
+        pk__in=[recipe.pk for recipe in recipes]))
+    feed.fan_out([recipe.pk for recipe in recipes])
+    return recipes
+
+
+def insert_links(model, user, field, ids, batch_size=500):
+    """Вставка связей с пропуском существующих, возвращает вставленные id.
+
+    INSERT ... ON CONFLICT DO NOTHING RETURNING возвращает только строки,
+    которые вставил этот запрос, даже если параллельный запрос добавил
+    часть тех же связей.
+    """
+    table = model._meta.db_table
+    column = model._meta.get_field(field).column
+    added = set()
+    with connections[router.db_for_write(model)].cursor() as cursor:
+        for chunk in iter_chunks(ids, batch_size):
+            cursor.execute(
+                f'INSERT INTO {table} (user_id, {column}) VALUES '
+                f'{", ".join(["(%s, %s)"] * len(chunk))} '
+                f'ON CONFLICT DO NOTHING RETURNING {column}',
+                [value for pk in chunk for value in (user.pk, pk)])
+            added.update(pk for pk, in cursor.fetchall())
+    return added
+
+
+@transaction.atomic
+def add_links(model, user, ids):
+    """Связи пользователя с рецептами или авторами одной вставкой.
+
+    Возвращает id добавленных и уже существовавших связей; id
+    несуществующих объектов не попадают ни в один из наборов.
+    """
+    target, field, counter = COUNTERS[model]
+    ids = set(target.objects.filter(pk__in=ids).values_list('pk', flat=True))
+    added = insert_links(model, user, field, sorted(ids))
+    increment(target.objects.filter(pk__in=added), counter, 1)
+    if model is Subscribe and added:
+        feed.backfill(user.pk, added)
+    return added, ids - added
+
+
+def delete_links(model, user, field, ids, batch_size=500):
+    """Удаление связей DELETE ... RETURNING, возвращает удалённые id.
+
+    Сырой DELETE не вызывает post_delete: счётчики, ленту и версию корзины
+    вызывающий код обновляет сам один раз на всю пачку.
+    """
+    table = model._meta.db_table
+    column = model._meta.get_field(field).column
+    removed = set()
+    with connections[router.db_for_write(model)].cursor() as cursor:
+        for chunk in iter_chunks(ids, batch_size):
+            cursor.execute(
+                f'DELETE FROM {table} WHERE user_id = %s AND {column} IN '
+                f'({", ".join(["%s"] * len(chunk))}) RETURNING {column}',
+                [user.pk, *chunk])
+            removed.update(pk for pk, in cursor.fetchall())
+    return removed
+
+
+@transaction.atomic
+def remove_links(model, user, ids):
+    """Удаление связей пользователя одним DELETE, возвращает удалённые id."""
+    target, field, counter = COUNTERS[model]
+    removed = delete_links(model, user, field, ids)
+    if removed:
+        increment(target.objects.filter(pk__in=removed), counter, -1)
+        if model is Subscribe:
+            feed.prune(user.pk, removed)
+    return removed
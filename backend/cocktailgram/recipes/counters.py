@@ -0,0 +1,42 @@
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from users.models import Subscribe, User
+from .models import Recipe, RecipeInFavorite, RecipeInShoppingCart
+
+COUNTERS = {
+    RecipeInFavorite: (Recipe, 'recipe_id', 'favorites_count'),
+    RecipeInShoppingCart: (Recipe, 'recipe_id', 'in_carts_count'),
+    Subscribe: (User, 'author_id', 'followers_count'),
+    Recipe: (User, 'author_id', 'recipes_count'),
+}
+
+
+def increment(queryset, field, delta):
+    """Атомарное изменение счётчика одним UPDATE ... SET f = f + delta."""
+    if delta < 0:
+        queryset = queryset.filter(**{f'{field}__gte': -delta})
+    queryset.update(**{field: F(field) + delta})
+
+
+def count_subquery(model, field):
+    return Coalesce(Subquery(
+        model.objects.filter(**{field: OuterRef('pk')}).order_by().values(
+            field).annotate(total=Count('pk')).values('total')
+    ), Value(0))
+
+
+def rebuild_recipe_counters(queryset=None):
+    """Пересчёт счётчиков рецептов одним UPDATE на всю выборку."""
+    queryset = Recipe.objects.all() if queryset is None else queryset
+    return queryset.update(
+        favorites_count=count_subquery(RecipeInFavorite, 'recipe'),
+        in_carts_count=count_subquery(RecipeInShoppingCart, 'recipe'))
+
+
+def rebuild_user_counters(queryset=None):
+    """Пересчёт счётчиков пользователей одним UPDATE на всю выборку."""
+    queryset = User.objects.all() if queryset is None else queryset
+    return queryset.update(
+        recipes_count=count_subquery(Recipe, 'author'),
+        followers_count=count_subquery(Subscribe, 'author'))
@@ -0,0 +1,120 @@
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.db.models import BigIntegerField, F, OuterRef, Q, Subquery, Value
+
+from users.models import Subscribe
+from .models import FeedEntry, Recipe
+
+ENTRY_COLUMNS = ('user_id', 'recipe_id', 'author_id', 'pub_date')
+
+
+def insert_entries(queryset, user, recipe, author, pub_date):
+    """Строки ленты из выборки одним INSERT ... SELECT.
+
+    Колонки задаются выражениями над выборкой; уже существующие записи
+    ленты пропускаются.
+    """
+    columns = {
+        f'feed_{name}': expression for name, expression in zip(
+            ENTRY_COLUMNS, (user, recipe, author, pub_date))}
+    queryset = queryset.annotate(**columns).values_list(*columns)
+    db = router.db_for_write(FeedEntry)
+    sql, params = queryset.query.get_compiler(using=db).as_sql()
+    with connections[db].cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {FeedEntry._meta.db_table} '
+            f'({", ".join(ENTRY_COLUMNS)}) {sql} ON CONFLICT DO NOTHING',
+            params)
+
+
+def pushed_subscriptions():
+    """Подписки на авторов, чьи рецепты раскладываются по лентам."""
+    return Subscribe.objects.filter(
+        author__followers_count__lte=settings.FEED_FANOUT_LIMIT)
+
+
+def fan_out(recipe_ids):
+    """Рецепты - в ленты подписчиков их авторов при записи.
+
+    Рецепты авторов с числом подписчиков больше FEED_FANOUT_LIMIT не
+    раскладываются: лента подтягивает их при чтении.
+    """
+    insert_entries(
+        pushed_subscriptions().filter(author__recipes__in=recipe_ids),
+        F('user_id'), F('author__recipes__id'), F('author_id'),
+        F('author__recipes__pub_date'))
+
+
+def backfill(user_id, author_ids):
+    """Последние FEED_BACKFILL_SIZE рецептов каждого нового автора - в ленту.
+
+    Последние рецепты автора выбирает коррелированный подзапрос с LIMIT
+    по индексу (author, -pub_date, -id).
+    """
+    latest = Recipe.objects.filter(
+        author_id=OuterRef('author_id')
+    ).order_by('-pub_date', '-id').values('pk')[:settings.FEED_BACKFILL_SIZE]
+    insert_entries(
+        Recipe.objects.filter(
+            author_id__in=author_ids,
+            author__followers_count__lte=settings.FEED_FANOUT_LIMIT,
+            pk__in=Subquery(latest),
+        ),
+        Value(user_id, output_field=BigIntegerField()), F('id'),
+        F('author_id'), F('pub_date'))
+
+
+def prune(user_id, author_ids):
+    """Удаление из ленты рецептов авторов, от которых отписались."""
+    FeedEntry.objects.filter(
+        user_id=user_id, author_id__in=author_ids).delete()
+
+
+@transaction.atomic
+def rebuild(users=None):
+    """Ленты заново по всем подпискам, возвращает число записей."""
+    entries = FeedEntry.objects.all()
+    subscriptions = pushed_subscriptions().filter(
+        author__recipes__isnull=False)
+    if users is not None:
+        entries = entries.filter(user__in=users)
+        subscriptions = subscriptions.filter(user__in=users)
+    entries.delete()
+    insert_entries(
+        subscriptions, F('user_id'), F('author__recipes__id'),
+        F('author_id'), F('author__recipes__pub_date'))
+    return entries.count()
+
+
+def pulled_authors(user):
+    """Авторы подписок, чьи рецепты лента берёт при чтении."""
+    return list(Subscribe.objects.filter(
+        user=user, author__followers_count__gt=settings.FEED_FANOUT_LIMIT
+    ).values_list('author_id', flat=True))
+
+
+def timeline(user, limit, position=None, descending=True):
+    """id не больше limit рецептов ленты после позиции (pub_date, id).
+
+    Записи ленты и рецепты крупных авторов читаются по ключу сортировки
+    двумя запросами с LIMIT и сливаются.
+    """
+    lookup = 'lt' if descending else 'gt'
+    prefix = '-' if descending else ''
+
+    def page(queryset, id_field):
+        if position is not None:
+            pub_date, pk = position
+            queryset = queryset.filter(
+                Q(**{f'pub_date__{lookup}': pub_date})
+                | Q(pub_date=pub_date, **{f'{id_field}__{lookup}': pk}))
+        return list(queryset.order_by(
+            f'{prefix}pub_date', f'{prefix}{id_field}'
+        ).values_list('pub_date', id_field)[:limit])
+
+    rows = page(FeedEntry.objects.filter(user=user), 'recipe_id')
+    authors = pulled_authors(user)
+    if authors:
+        rows += page(Recipe.objects.filter(author_id__in=authors), 'id')
+    rows = sorted(set(rows), reverse=descending)[:limit]
+    return [pk for _, pk in rows]
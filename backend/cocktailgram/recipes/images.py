@@ -0,0 +1,57 @@
+import io
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from PIL import Image
+
+from api.http_cache import recipes_changed
+from .models import Recipe
+
+logger = logging.getLogger(__name__)
+
+executor = ThreadPoolExecutor(
+    max_workers=settings.IMAGE_WORKERS, thread_name_prefix='images')
+
+
+def thumbnail_name(image_name):
+    stem = os.path.splitext(os.path.basename(image_name))[0]
+    return f'images/thumbnails/{stem}.webp'
+
+
+def build_thumbnail(recipe_id, image_name):
+    """Уменьшенная WebP-копия изображения рецепта."""
+    with default_storage.open(image_name) as f, Image.open(f) as image:
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA')
+        image.thumbnail(settings.RECIPE_THUMBNAIL_SIZE)
+        buffer = io.BytesIO()
+        image.save(buffer, 'WEBP', quality=80)
+    name = default_storage.save(
+        thumbnail_name(image_name), ContentFile(buffer.getvalue()))
+    updated = Recipe.objects.filter(
+        pk=recipe_id, image=image_name).update(image_thumbnail=name)
+    if updated:
+        recipes_changed()
+    else:
+        default_storage.delete(name)
+
+
+def run_thumbnail(recipe_id, image_name):
+    try:
+        build_thumbnail(recipe_id, image_name)
+    except Exception:
+        logger.exception('Не удалось создать миниатюру %s', image_name)
+    finally:
+        connection.close()
+
+
+def schedule_thumbnail(recipe):
+    """Создание миниатюры в пуле потоков после коммита транзакции."""
+    recipe_id, image_name = recipe.pk, recipe.image.name
+    transaction.on_commit(
+        lambda: executor.submit(run_thumbnail, recipe_id, image_name))
@@ -0,0 +1,21 @@
+from django.core.management import BaseCommand
+
+from recipes.images import build_thumbnail
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    """Создание недостающих миниатюр, например после импорта рецептов."""
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.filter(image_thumbnail='').exclude(
+            image='').values_list('pk', 'image')
+        total = 0
+        for recipe_id, image_name in recipes.iterator():
+            try:
+                build_thumbnail(recipe_id, image_name)
+            except Exception as error:
+                self.stderr.write(f'{image_name}: {error}')
+            else:
+                total += 1
+        self.stdout.write(self.style.SUCCESS(f'Создано миниатюр: {total}.'))
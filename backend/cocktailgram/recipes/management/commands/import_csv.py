@@ -1,34 +1,152 @@
-from django.core.management import BaseCommand
+from django.core.management import BaseCommand, CommandError
 import csv
-from django.conf import settings
+import json
 import os
+import time
+from django.conf import settings
+from django.db import connection
 
-from recipes.models import Ingredient
+from api.autocomplete import ingredient_index
+from api.http_cache import recipes_changed
+from api.inventory import inventory_index
+from api.registry import tag_registry
+from recipes import bulk
 
 
 DATA_ROOT = os.path.join(settings.BASE_DIR, 'data')
 
+FIELDS = {
+    'ingredients': ('name', 'measurement_unit'),
+    'tags': ('name', 'slug', 'color'),
+    'recipes': ('author', 'name', 'text', 'cooking_time', 'image',
+                'tags', 'ingredients'),
+}
+
+
+def parse_recipe(row):
+    """Рецепт из CSV: теги через |, ингредиенты как id:количество через |.
+
+    Поля проверяет bulk.prepare_recipes, здесь только приводятся типы.
+    """
+    if isinstance(row.get('tags'), str):
+        row['tags'] = [slug for slug in row['tags'].split('|') if slug]
+    if isinstance(row.get('ingredients'), str):
+        row['ingredients'] = [
+            dict(zip(('id', 'amount'), item.split(':')))
+            for item in row['ingredients'].split('|') if item]
+    if isinstance(row.get('ingredients'), list):
+        row['ingredients'] = [
+            {'id': int(item['id']), 'amount': int(item['amount'])}
+            for item in row['ingredients']]
+    if isinstance(row.get('cooking_time'), str):
+        row['cooking_time'] = int(row['cooking_time'])
+    return row
+
 
 class Command(BaseCommand):
-    """Выгрузка csv-ингредиентов."""
+    """Потоковая загрузка ингредиентов, тегов и рецептов из CSV/JSONL.
+
+    Файл читается построчно, поэтому JSON принимается только в формате
+    JSON Lines: json.load загрузил бы весь массив в память. Повторный
+    запуск не создаёт дублей: существующие строки пропускаются.
+    """
 
     def add_arguments(self, parser):
         parser.add_argument(
             'csv_file',
             default='ingredients.csv',
             type=str)
+        parser.add_argument(
+            '--model',
+            choices=tuple(FIELDS),
+            default='ingredients')
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000)
+        parser.add_argument(
+            '--no-copy',
+            action='store_true',
+            help='Не использовать COPY даже на PostgreSQL.')
+
+    def read_rows(self, path, fields):
+        extension = os.path.splitext(path)[1].lower()
+        with open(path, 'r', encoding='utf-8') as f:
+            if extension == '.csv':
+                for row in csv.reader(f, delimiter=','):
+                    yield dict(zip(fields, row))
+            elif extension == '.jsonl':
+                for number, line in enumerate(f, 1):
+                    if not line.strip():
+                        continue
+                    try:
+                        yield json.loads(line)
+                    except json.JSONDecodeError as error:
+                        self.stderr.write(
+                            f'Строка {number} пропущена: {error}')
+            elif extension == '.json':
+                raise CommandError(
+                    'JSON загружается только построчно: преобразуйте файл в '
+                    'JSON Lines (.jsonl), по объекту в строке.')
+            else:
+                raise CommandError(f'Неизвестный формат файла: {path}')
 
     def handle(self, *args, **options):
+        model = options['model']
+        batch_size = options['batch_size']
+        path = os.path.join(DATA_ROOT, options['csv_file'])
+        rows = self.read_rows(path, FIELDS[model])
+
+        if model == 'ingredients':
+            use_copy = (connection.vendor == 'postgresql'
+                        and not options['no_copy'])
+            loader = (bulk.copy_ingredients if use_copy
+                      else bulk.import_ingredients)
+            batches = loader(rows, batch_size)
+        elif model == 'tags':
+            batches = bulk.import_tags(rows, batch_size)
+        else:
+            batches = self.import_recipes(rows, batch_size)
+
+        started = time.monotonic()
+        total = 0
+        for count in batches:
+            total += count
+            elapsed = time.monotonic() - started
+            self.stdout.write(
+                f'{model}: {total} строк, '
+                f'{total / max(elapsed, 1e-6):.0f} строк/с')
+
+        if model == 'ingredients':
+            ingredient_index.bump()
+        elif model == 'tags':
+            tag_registry.bump()
+        else:
+            inventory_index.bump()
+        recipes_changed()
+        self.stdout.write(self.style.SUCCESS(
+            f'Загружено {total} строк за '
+            f'{time.monotonic() - started:.1f} с.'))
 
-        csv_file = options['csv_file']
-        ingredients_list = []
-        with open(os.path.join(DATA_ROOT, csv_file),
-                  'r', encoding="utf-8") as f:
-            reader = csv.reader(f, delimiter=',')
-            for row in reader:
-                name, measurement_unit = row
-                ingredient = Ingredient(
-                    name=name,
-                    measurement_unit=measurement_unit)
-                ingredients_list.append(ingredient)
-        Ingredient.objects.bulk_create(ingredients_list)
+    def import_recipes(self, rows, batch_size):
+        skipped = 0
+        for chunk in bulk.iter_chunks(enumerate(rows, 1), batch_size):
+            numbers, parsed = [], []
+            for number, row in chunk:
+                try:
+                    parsed.append(parse_recipe(row))
+                    numbers.append(number)
+                except (AttributeError, KeyError, TypeError, ValueError):
+                    skipped += 1
+                    self.stderr.write(
+                        f'Рецепт {number} пропущен: некорректные поля.')
+            valid, errors = bulk.prepare_recipes(parsed)
+            for index, message in errors:
+                self.stderr.write(
+                    f'Рецепт {numbers[index]} пропущен: {message}')
+            skipped += len(errors)
+            if valid:
+                bulk.create_recipes(valid)
+            yield len(chunk)
+        if skipped:
+            self.stderr.write(f'Пропущено рецептов: {skipped}.')
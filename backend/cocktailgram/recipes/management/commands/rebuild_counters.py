@@ -0,0 +1,13 @@
+from django.core.management import BaseCommand
+
+from recipes.counters import rebuild_recipe_counters, rebuild_user_counters
+
+
+class Command(BaseCommand):
+    """Пересчёт денормализованных счётчиков рецептов и пользователей."""
+
+    def handle(self, *args, **options):
+        recipes = rebuild_recipe_counters()
+        users = rebuild_user_counters()
+        self.stdout.write(self.style.SUCCESS(
+            f'Пересчитано рецептов: {recipes}, пользователей: {users}.'))
@@ -0,0 +1,20 @@
+from django.core.management import BaseCommand
+
+from recipes.feed import rebuild
+from users.models import User
+
+
+class Command(BaseCommand):
+    """Пересборка лент подписок всех или указанных пользователей."""
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append',
+                            dest='users', help='id пользователя')
+
+    def handle(self, *args, **options):
+        users = options['users']
+        if users is not None:
+            users = User.objects.filter(pk__in=users)
+        entries = rebuild(users)
+        self.stdout.write(self.style.SUCCESS(
+            f'Записей в лентах: {entries}.'))
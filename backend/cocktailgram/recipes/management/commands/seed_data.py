@@ -0,0 +1,218 @@
+import csv
+import io
+import os
+import random
+import time
+from itertools import accumulate
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import BaseCommand, CommandError
+from PIL import Image
+
+from api.autocomplete import ingredient_index
+from api.http_cache import recipes_changed
+from api.inventory import inventory_index
+from api.registry import tag_registry
+from recipes import bulk, feed
+from recipes.counters import rebuild_recipe_counters, rebuild_user_counters
+from recipes.models import (Ingredient, RecipeInFavorite,
+                            RecipeInShoppingCart, Tag)
+from users.models import Subscribe, User
+
+DATA_ROOT = os.path.join(settings.BASE_DIR, 'data')
+
+TAGS = (
+    ('Завтрак', 'breakfast', '#E26C2D'),
+    ('Обед', 'lunch', '#49B64E'),
+    ('Ужин', 'dinner', '#8775D2'),
+    ('Коктейль', 'cocktail', '#D2386C'),
+    ('Безалкогольный', 'non-alcoholic', '#2D9CDB'),
+    ('Десерт', 'dessert', '#F2C94C'),
+    ('Быстро', 'quick', '#6FCF97'),
+    ('Праздник', 'party', '#BB6BD9'),
+)
+
+
+class ZipfSampler:
+    """Выбор объектов с распределением Ципфа: немногие встречаются часто.
+
+    Объекты перемешиваются, чтобы популярными оказались не первые id.
+    """
+
+    def __init__(self, rng, population, exponent):
+        self.rng = rng
+        self.population = list(population)
+        rng.shuffle(self.population)
+        self.cum_weights = list(accumulate(
+            1 / rank ** exponent
+            for rank in range(1, len(self.population) + 1)))
+
+    def sample(self, count):
+        """До count разных объектов."""
+        count = min(count, len(self.population))
+        chosen = set()
+        for _ in range(count * 4):
+            chosen.update(self.rng.choices(
+                self.population, cum_weights=self.cum_weights,
+                k=count - len(chosen)))
+            if len(chosen) >= count:
+                break
+        return chosen
+
+    def one(self):
+        return self.rng.choices(
+            self.population, cum_weights=self.cum_weights)[0]
+
+
+class Command(BaseCommand):
+    """Генерация данных для бенчмарков с реалистичным перекосом.
+
+    Немногие авторы пишут большую часть рецептов и собирают большую часть
+    подписчиков, немногие рецепты попадают в избранное и корзины чаще
+    прочих, число связей на пользователя распределено по Парето.
+    Повторный запуск с тем же --seed даёт те же данные, но требует
+    другого --prefix.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--recipes', type=int, default=10_000)
+        parser.add_argument('--ingredients', type=int, default=2000)
+        parser.add_argument('--favorites', type=int, default=20,
+                            help='Среднее число избранных на пользователя')
+        parser.add_argument('--carts', type=int, default=5,
+                            help='Среднее число рецептов в корзине')
+        parser.add_argument('--subscriptions', type=int, default=10,
+                            help='Среднее число подписок на пользователя')
+        parser.add_argument('--prefix', default='bench')
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.prefix = options['prefix']
+        self.batch_size = options['batch_size']
+        if User.objects.filter(
+                username__startswith=f'{self.prefix}_').exists():
+            raise CommandError(
+                f'Данные с префиксом {self.prefix} уже есть, '
+                f'укажите другой --prefix.')
+        started = time.monotonic()
+
+        ingredient_ids = self.create_ingredients(options['ingredients'])
+        tag_ids = self.create_tags()
+        user_ids = self.create_users(options['users'])
+        recipe_ids = self.create_recipes(
+            options['recipes'], user_ids, ingredient_ids, tag_ids)
+        recipes = ZipfSampler(self.rng, recipe_ids, 1.0)
+        self.create_links(
+            RecipeInFavorite, 'recipe_id', user_ids, recipes,
+            options['favorites'])
+        self.create_links(
+            RecipeInShoppingCart, 'recipe_id', user_ids, recipes,
+            options['carts'])
+        self.create_links(
+            Subscribe, 'author_id', user_ids,
+            ZipfSampler(self.rng, user_ids, 1.2), options['subscriptions'],
+            self_links=False)
+
+        self.stdout.write('Пересчёт счётчиков и лент...')
+        rebuild_recipe_counters()
+        rebuild_user_counters()
+        feed.rebuild()
+        ingredient_index.bump()
+        tag_registry.bump()
+        inventory_index.bump()
+        recipes_changed()
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово за {time.monotonic() - started:.1f} с.'))
+
+    def report(self, name, count):
+        self.stdout.write(f'{name}: {count}')
+
+    def create_ingredients(self, count):
+        with open(os.path.join(DATA_ROOT, 'ingredients.csv'),
+                  encoding='utf-8') as f:
+            rows = [dict(zip(('name', 'measurement_unit'), row))
+                    for row in csv.reader(f)]
+        rows = rows[:count] + [
+            {'name': f'{self.prefix} ингредиент {index}',
+             'measurement_unit': 'г'}
+            for index in range(count - len(rows))]
+        for _ in bulk.import_ingredients(rows, self.batch_size):
+            pass
+        ids = list(Ingredient.objects.filter(
+            name__in=[row['name'] for row in rows]
+        ).order_by('id').values_list('id', flat=True))
+        self.report('Ингредиенты', len(ids))
+        return ids
+
+    def create_tags(self):
+        for _ in bulk.import_tags(
+                [dict(zip(('name', 'slug', 'color'), tag)) for tag in TAGS],
+                self.batch_size):
+            pass
+        return list(Tag.objects.order_by('id').values_list('id', flat=True))
+
+    def create_users(self, count):
+        password = make_password(self.prefix)
+        User.objects.bulk_create((
+            User(username=f'{self.prefix}_{index}',
+                 email=f'{self.prefix}_{index}@example.com',
+                 first_name='Имя', last_name='Фамилия', password=password)
+            for index in range(count)), batch_size=self.batch_size)
+        ids = list(User.objects.filter(
+            username__startswith=f'{self.prefix}_'
+        ).order_by('id').values_list('id', flat=True))
+        self.report('Пользователи', len(ids))
+        return ids
+
+    def placeholder_image(self):
+        buffer = io.BytesIO()
+        Image.new('RGB', (600, 400), (226, 108, 45)).save(buffer, 'PNG')
+        return default_storage.save(
+            f'images/{self.prefix}_placeholder.png',
+            ContentFile(buffer.getvalue()))
+
+    def create_recipes(self, count, user_ids, ingredient_ids, tag_ids):
+        authors = ZipfSampler(self.rng, user_ids, 1.1)
+        ingredients = ZipfSampler(self.rng, ingredient_ids, 0.8)
+        image = self.placeholder_image()
+        rows = (
+            {'author': authors.one(),
+             'name': f'{self.prefix} рецепт {index}',
+             'text': 'Смешать все ингредиенты. ' * self.rng.randint(1, 15),
+             'cooking_time': self.rng.randint(1, 120),
+             'image': image,
+             'tags': self.rng.sample(tag_ids, self.rng.randint(1, 3)),
+             'ingredients': [
+                 {'id': ingredient_id, 'amount': self.rng.randint(1, 500)}
+                 for ingredient_id in ingredients.sample(
+                     self.rng.randint(3, 10))]}
+            for index in range(count))
+        ids = []
+        for chunk in bulk.iter_chunks(rows, self.batch_size):
+            ids.extend(recipe.pk for recipe in bulk.create_recipes(chunk))
+            self.report('Рецепты', len(ids))
+        return ids
+
+    def create_links(self, model, field, user_ids, targets, mean,
+                     self_links=True):
+        """Связи пользователей с целями, число на пользователя по Парето."""
+        total = 0
+        for chunk in bulk.iter_chunks(user_ids, self.batch_size):
+            links = []
+            for user_id in chunk:
+                count = min(
+                    int(self.rng.paretovariate(1.5) * mean / 3), mean * 50)
+                links.extend(
+                    model(user_id=user_id, **{field: target})
+                    for target in targets.sample(count)
+                    if self_links or target != user_id)
+            model.objects.bulk_create(
+                links, batch_size=self.batch_size, ignore_conflicts=True)
+            total += len(links)
+        self.report(model._meta.verbose_name_plural, total)
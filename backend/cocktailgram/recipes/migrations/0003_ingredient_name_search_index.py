@@ -0,0 +1,36 @@
+from django.db import migrations
+
+INDEX_NAME = 'recipes_ingredient_name_search'
+
+CREATE_SQL = {
+    'postgresql': (
+        'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+        f'CREATE INDEX IF NOT EXISTS {INDEX_NAME} ON recipes_ingredient '
+        f'USING gin ((UPPER(name::text)) gin_trgm_ops)',
+    ),
+    'sqlite': (
+        f'CREATE INDEX IF NOT EXISTS {INDEX_NAME} ON recipes_ingredient '
+        f'(name COLLATE NOCASE)',
+    ),
+}
+
+
+def create_index(apps, schema_editor):
+    for sql in CREATE_SQL.get(schema_editor.connection.vendor, ()):
+        schema_editor.execute(sql)
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor in CREATE_SQL:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {INDEX_NAME}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 3.2.3 on 2026-10-18 14:29
+
+import django.contrib.postgres.search
+from django.conf import settings
+from django.db import migrations
+
+INDEX_NAME = 'recipes_recipe_search_vector'
+
+FILL_SQL = """
+UPDATE recipes_recipe AS r SET search_vector =
+    setweight(to_tsvector(%(config)s::regconfig, r.name), 'A')
+    || setweight(to_tsvector(%(config)s::regconfig, r.text), 'B')
+    || setweight(to_tsvector(%(config)s::regconfig, coalesce((
+        SELECT string_agg(i.name, ' ')
+        FROM recipes_recipeingredient AS ri
+        JOIN recipes_ingredient AS i ON i.id = ri.ingredient_id
+        WHERE ri.recipe_id = r.id), '')), 'C')
+"""
+
+
+def create_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        f'CREATE INDEX IF NOT EXISTS {INDEX_NAME} ON recipes_recipe '
+        f'USING gin (search_vector)')
+    schema_editor.execute(FILL_SQL, {'config': settings.SEARCH_CONFIG})
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(f'DROP INDEX IF EXISTS {INDEX_NAME}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0007_recipe_name_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 3.2.3 on 2026-10-18 14:36
+
+from django.db import migrations, models
+
+# Автоматическая таблица тегов рецепта: индекс для выборок от тега.
+TAG_INDEX = 'recipes_recipe_tags_tag_recipe'
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0009_feed'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-pub_date', '-id'], name='recipe_pub_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['author', '-pub_date', '-id'], name='recipe_author_pub_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipeinfavorite',
+            index=models.Index(fields=['recipe', 'user'], name='favorite_recipe_user_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipeinshoppingcart',
+            index=models.Index(fields=['recipe', 'user'], name='cart_recipe_user_idx'),
+        ),
+        migrations.RunSQL(
+            f'CREATE INDEX IF NOT EXISTS {TAG_INDEX} '
+            f'ON recipes_recipe_tags (tag_id, recipe_id)',
+            f'DROP INDEX IF EXISTS {TAG_INDEX}',
+        ),
+    ]
@@ -1,7 +1,9 @@
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
+from django.db.models.functions import RowNumber
 from django.core.validators import MinValueValidator
 
-from users.models import User
+from users.models import CounterFieldsMixin, Subscribe, User
 
 
 class Ingredient(models.Model):
@@ -40,7 +42,55 @@ class Tag(models.Model):
         return self.name
 
 
-class Recipe(models.Model):
+USER_FLAGS = ('is_favorited', 'is_in_shopping_cart', 'author_is_subscribed')
+
+
+class RecipeQuerySet(models.QuerySet):
+    """Выборки рецептов для отображения."""
+
+    def with_related(self, author=True, ingredients=True):
+        # Поисковый вектор нужен только в WHERE, в ответы он не попадает.
+        queryset = self.defer('search_vector')
+        if author:
+            queryset = queryset.select_related('author')
+        if ingredients:
+            queryset = queryset.prefetch_related(models.Prefetch(
+                'recipe_ingredient',
+                queryset=RecipeIngredient.objects.select_related(
+                    'ingredient')))
+        return queryset
+
+    def with_user_flags(self, user, flags=USER_FLAGS):
+        if user is None or user.is_anonymous:
+            return self.annotate(**{
+                flag: models.Value(False, output_field=models.BooleanField())
+                for flag in flags})
+        annotations = {
+            'is_favorited': models.Exists(RecipeInFavorite.objects.filter(
+                user=user, recipe=models.OuterRef('pk'))),
+            'is_in_shopping_cart': models.Exists(
+                RecipeInShoppingCart.objects.filter(
+                    user=user, recipe=models.OuterRef('pk'))),
+            'author_is_subscribed': models.Exists(Subscribe.objects.filter(
+                user=user, author=models.OuterRef('author'))),
+        }
+        return self.annotate(**{flag: annotations[flag] for flag in flags})
+
+    def limited_per_author(self, limit):
+        """Первые limit рецептов каждого автора одним запросом."""
+        ranked = self.annotate(recipe_rank=models.Window(
+            expression=RowNumber(),
+            partition_by=models.F('author_id'),
+            order_by=(models.F('pub_date').desc(), models.F('id').desc())))
+        sql, params = ranked.query.sql_with_params()
+        return self.model.objects.raw(
+            f'SELECT * FROM ({sql}) AS ranked '
+            f'WHERE ranked.recipe_rank <= %s '
+            f'ORDER BY ranked.author_id, ranked.recipe_rank',
+            (*params, limit))
+
+
+class Recipe(CounterFieldsMixin, models.Model):
     """Модель рецепта."""
 
     author = models.ForeignKey(
@@ -50,6 +100,11 @@ class Recipe(models.Model):
         related_name='recipes')
     name = models.CharField('Название', max_length=200)
     image = models.ImageField('Изображение', upload_to='images/')
+    image_thumbnail = models.ImageField(
+        'Миниатюра',
+        upload_to='images/thumbnails/',
+        blank=True,
+        editable=False)
     text = models.TextField('Описание', max_length=500)
     ingredients = models.ManyToManyField(Ingredient,
                                          verbose_name='Ингредиенты',
@@ -63,11 +118,26 @@ class Recipe(models.Model):
         default=1,
         validators=[MinValueValidator(1)])
     pub_date = models.DateTimeField('Дата публикации', auto_now_add=True)
+    favorites_count = models.PositiveIntegerField(
+        'В избранном', default=0, editable=False)
+    in_carts_count = models.PositiveIntegerField(
+        'В корзинах', default=0, editable=False)
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    objects = RecipeQuerySet.as_manager()
+
+    counter_fields = ('favorites_count', 'in_carts_count')
 
     class Meta:
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
-        ordering = ('-pub_date', )
+        ordering = ('-pub_date', '-id')
+        indexes = (
+            models.Index(fields=('-pub_date', '-id'),
+                         name='recipe_pub_date_idx'),
+            models.Index(fields=('author', '-pub_date', '-id'),
+                         name='recipe_author_pub_date_idx'),
+        )
 
     def __str__(self):
         return f'{self.name} - {self.author}'
@@ -118,6 +188,10 @@ class RecipeInShoppingCart(models.Model):
                 name='unique_user_recipe_cart'
             ),
         )
+        indexes = (
+            models.Index(fields=('recipe', 'user'),
+                         name='cart_recipe_user_idx'),
+        )
 
     def __str__(self):
         return f'{self.recipe} в корзине у {self.user} .'
@@ -144,6 +218,48 @@ class RecipeInFavorite(models.Model):
                 name='unique_user_recipe_favorite'
             ),
         )
+        indexes = (
+            models.Index(fields=('recipe', 'user'),
+                         name='favorite_recipe_user_idx'),
+        )
 
     def __str__(self):
         return f'{self.recipe} в избранном у {self.user}.'
+
+
+class FeedEntry(models.Model):
+    """Запись ленты подписчика: рецепт автора, на которого он подписан.
+
+    Дата публикации и автор копируются из рецепта, чтобы лента читалась
+    по одному индексу (user, pub_date, recipe) без соединения с рецептами.
+    """
+
+    user = models.ForeignKey(User,
+                             verbose_name='Подписчик',
+                             on_delete=models.CASCADE,
+                             related_name='feed')
+    recipe = models.ForeignKey(Recipe,
+                               verbose_name='Рецепт',
+                               on_delete=models.CASCADE,
+                               related_name='feed_entries')
+    author = models.ForeignKey(User,
+                               verbose_name='Автор',
+                               on_delete=models.CASCADE,
+                               related_name='+')
+    pub_date = models.DateTimeField('Дата публикации')
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Лента подписок'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'recipe'),
+                name='unique_user_recipe_feed'
+            ),
+        )
+        indexes = (
+            models.Index(fields=('user', '-pub_date', '-recipe'),
+                         name='feed_user_pub_date_idx'),
+            models.Index(fields=('user', 'author'),
+                         name='feed_user_author_idx'),
+        )
@@ -0,0 +1,69 @@
+from django.conf import settings
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                            SearchVector)
+from django.db import connections, transaction
+from django.db.models import (Case, Exists, F, IntegerField, OuterRef, Q,
+                              Subquery, TextField, Value, When)
+from django.db.models.functions import Coalesce
+
+from .models import Ingredient, Recipe, RecipeIngredient
+
+
+def is_postgresql(queryset):
+    return connections[queryset.db].vendor == 'postgresql'
+
+
+def search_vector(config):
+    """Вектор рецепта: название (A), описание (B), ингредиенты (C)."""
+    ingredient_names = Subquery(
+        RecipeIngredient.objects.filter(recipe=OuterRef('pk')).order_by(
+        ).values('recipe').annotate(
+            names=StringAgg('ingredient__name', ' ')
+        ).values('names'),
+        output_field=TextField())
+    return (
+        SearchVector('name', weight='A', config=config)
+        + SearchVector('text', weight='B', config=config)
+        + SearchVector(Coalesce(ingredient_names, Value(''),
+                                output_field=TextField()),
+                       weight='C', config=config))
+
+
+def update_search_vectors(queryset):
+    """Пересчёт search_vector выборки одним UPDATE (только PostgreSQL)."""
+    if is_postgresql(queryset):
+        queryset.update(search_vector=search_vector(settings.SEARCH_CONFIG))
+
+
+def schedule_search_update(queryset):
+    transaction.on_commit(lambda: update_search_vectors(queryset))
+
+
+def ingredient_recipes(ingredient_id):
+    return Recipe.objects.filter(Exists(RecipeIngredient.objects.filter(
+        recipe=OuterRef('pk'), ingredient_id=ingredient_id)))
+
+
+def search_recipes(queryset, text):
+    """Рецепты, подходящие под запрос, от более релевантных к менее.
+
+    На PostgreSQL - полнотекстовый поиск по search_vector и GIN-индексу,
+    на SQLite - поиск подстрок для разработки.
+    """
+    if is_postgresql(queryset):
+        query = SearchQuery(
+            text, config=settings.SEARCH_CONFIG, search_type='websearch')
+        return queryset.filter(search_vector=query).annotate(
+            rank=SearchRank(F('search_vector'), query)
+        ).order_by('-rank', '-pub_date', '-id')
+    for term in text.split():
+        queryset = queryset.filter(
+            Q(name__icontains=term) | Q(text__icontains=term)
+            | Q(Exists(Ingredient.objects.filter(
+                name__icontains=term,
+                recipe_ingredient__recipe=OuterRef('pk')))))
+    return queryset.annotate(rank=Case(
+        When(name__icontains=text, then=Value(2)),
+        default=Value(1), output_field=IntegerField(),
+    )).order_by('-rank', '-pub_date', '-id')
@@ -0,0 +1,64 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from users.models import Subscribe
+from . import feed
+from .counters import COUNTERS, increment
+from .models import (Ingredient, Recipe, RecipeIngredient, RecipeInFavorite,
+                     RecipeInShoppingCart)
+from .search import ingredient_recipes, schedule_search_update
+
+
+@receiver(post_save, sender=RecipeInFavorite)
+@receiver(post_save, sender=RecipeInShoppingCart)
+@receiver(post_save, sender=Subscribe)
+@receiver(post_save, sender=Recipe)
+def counter_increment(sender, instance, created, **kwargs):
+    if created:
+        model, field, counter = COUNTERS[sender]
+        increment(
+            model.objects.filter(pk=getattr(instance, field)), counter, 1)
+
+
+@receiver(post_delete, sender=RecipeInFavorite)
+@receiver(post_delete, sender=RecipeInShoppingCart)
+@receiver(post_delete, sender=Subscribe)
+@receiver(post_delete, sender=Recipe)
+def counter_decrement(sender, instance, **kwargs):
+    model, field, counter = COUNTERS[sender]
+    increment(model.objects.filter(pk=getattr(instance, field)), counter, -1)
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_search_changed(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or {'name', 'text'} & set(update_fields):
+        schedule_search_update(Recipe.objects.filter(pk=instance.pk))
+
+
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+def recipe_ingredients_changed(sender, instance, **kwargs):
+    schedule_search_update(Recipe.objects.filter(pk=instance.recipe_id))
+
+
+@receiver(post_save, sender=Ingredient)
+def ingredient_renamed(sender, instance, created, **kwargs):
+    if not created:
+        schedule_search_update(ingredient_recipes(instance.pk))
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_published(sender, instance, created, **kwargs):
+    if created:
+        feed.fan_out((instance.pk,))
+
+
+@receiver(post_save, sender=Subscribe)
+def subscribed(sender, instance, created, **kwargs):
+    if created:
+        feed.backfill(instance.user_id, (instance.author_id,))
+
+
+@receiver(post_delete, sender=Subscribe)
+def unsubscribed(sender, instance, **kwargs):
+    feed.prune(instance.user_id, (instance.author_id,))
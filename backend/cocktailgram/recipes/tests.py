@@ -0,0 +1,97 @@
+from types import SimpleNamespace
+from unittest import skipUnless
+
+from django.db import connection
+from django.test import TestCase
+
+from api.filters import RecipeFilter
+from api.registry import tag_registry
+from users.models import User
+from .models import Recipe, RecipeInFavorite, RecipeInShoppingCart, Tag
+
+# Планы большой выдачи: рецепты обходятся по дате, связь проверяется
+# для каждого рецепта, а не собирается целиком с сортировкой.
+PROBE_SETTINGS = (
+    'enable_sort', 'enable_bitmapscan', 'enable_hashjoin',
+    'enable_mergejoin', 'enable_material')
+
+only_postgresql = skipUnless(
+    connection.vendor == 'postgresql',
+    'SQLite проверяет связь, заданную по обоим столбцам, только '
+    'уникальным индексом')
+
+
+@skipUnless(connection.vendor in ('postgresql', 'sqlite'),
+            'Планы запросов проверяются на PostgreSQL и SQLite')
+class RecipeFilterPlanTests(TestCase):
+    """Фильтры рецептов выбираются по индексам, а не перебором таблиц."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='reader', email='reader@example.com')
+        cls.author = User.objects.create_user(
+            username='author', email='author@example.com')
+        cls.tags = [
+            Tag.objects.create(name=slug, slug=slug, color=color)
+            for slug, color in (
+                ('breakfast', '#E26C2D'), ('dinner', '#49B64E'))]
+        recipes = [
+            Recipe.objects.create(
+                author=cls.author, name=f'Рецепт {index}', text='Текст',
+                image='images/recipe.png')
+            for index in range(3)]
+        recipes[0].tags.set(cls.tags)
+        RecipeInFavorite.objects.create(user=cls.user, recipe=recipes[0])
+        RecipeInShoppingCart.objects.create(user=cls.user, recipe=recipes[1])
+
+    def setUp(self):
+        tag_registry.bump()
+        if connection.vendor == 'postgresql':
+            # На нескольких строках последовательный просмотр дешевле.
+            self.disable('enable_seqscan')
+
+    def disable(self, *names):
+        with connection.cursor() as cursor:
+            for name in names:
+                cursor.execute(f'SET LOCAL {name} = off')
+
+    def plan(self, data):
+        queryset = RecipeFilter(
+            data, queryset=Recipe.objects.all(),
+            request=SimpleNamespace(user=self.user)).qs
+        return queryset[:6].explain()
+
+    def assertUsesIndex(self, plan, name):
+        self.assertIn(name, plan, f'В плане нет индекса {name}:\n{plan}')
+
+    def test_list(self):
+        self.assertUsesIndex(self.plan({}), 'recipe_pub_date_idx')
+
+    def test_author(self):
+        self.assertUsesIndex(
+            self.plan({'author': self.author.pk}),
+            'recipe_author_pub_date_idx')
+
+    @only_postgresql
+    def test_tags(self):
+        for mode in ('any', 'all'):
+            with self.subTest(mode=mode):
+                plan = self.plan({
+                    'tags': [tag.slug for tag in self.tags],
+                    'tags_mode': mode})
+                self.assertUsesIndex(plan, 'recipes_recipe_tags_tag_recipe')
+
+    @only_postgresql
+    def test_favorited(self):
+        self.disable(*PROBE_SETTINGS)
+        plan = self.plan({'is_favorited': 1})
+        self.assertUsesIndex(plan, 'recipe_pub_date_idx')
+        self.assertUsesIndex(plan, 'favorite_recipe_user_idx')
+
+    @only_postgresql
+    def test_in_shopping_cart(self):
+        self.disable(*PROBE_SETTINGS)
+        plan = self.plan({'is_in_shopping_cart': 1})
+        self.assertUsesIndex(plan, 'recipe_pub_date_idx')
+        self.assertUsesIndex(plan, 'cart_recipe_user_idx')
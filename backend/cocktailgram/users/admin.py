@@ -1,14 +1,19 @@
 from django.contrib import admin
 
+from cocktailgram.admin import ScalableAdmin
 from .models import User, Subscribe
 
 
 @admin.register(User)
-class UserAdmin(admin.ModelAdmin):
-    list_display = ('id', 'username', 'first_name', 'email',)
-    list_filter = ('first_name', 'email',)
+class UserAdmin(ScalableAdmin):
+    list_display = ('id', 'username', 'first_name', 'email',
+                    'recipes_count', 'followers_count')
+    search_fields = ('username', 'email')
+    readonly_fields = ('recipes_count', 'followers_count')
 
 
 @admin.register(Subscribe)
-class SubscribeAdmin(admin.ModelAdmin):
+class SubscribeAdmin(ScalableAdmin):
     list_display = ('user', 'author',)
+    list_select_related = ('user', 'author')
+    raw_id_fields = ('user', 'author')
@@ -0,0 +1,40 @@
+from django.db import migrations
+
+INDEXES = {
+    'users_user_username_search': 'username',
+    'users_user_email_search': 'email',
+}
+
+
+def create_sql(vendor):
+    if vendor == 'postgresql':
+        yield 'CREATE EXTENSION IF NOT EXISTS pg_trgm'
+        for name, column in INDEXES.items():
+            yield (f'CREATE INDEX IF NOT EXISTS {name} ON users_user '
+                   f'USING gin ((UPPER({column}::text)) gin_trgm_ops)')
+    elif vendor == 'sqlite':
+        for name, column in INDEXES.items():
+            yield (f'CREATE INDEX IF NOT EXISTS {name} ON users_user '
+                   f'({column} COLLATE NOCASE)')
+
+
+def create_indexes(apps, schema_editor):
+    for sql in create_sql(schema_editor.connection.vendor):
+        schema_editor.execute(sql)
+
+
+def drop_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor in ('postgresql', 'sqlite'):
+        for name in INDEXES:
+            schema_editor.execute(f'DROP INDEX IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
@@ -3,7 +3,32 @@ from django.contrib.auth.models import AbstractUser
 from django.contrib.auth.validators import UnicodeUsernameValidator
 
 
-class User(AbstractUser):
+class CounterFieldsMixin:
+    """Модель с денормализованными счётчиками.
+
+    Счётчики меняются только UPDATE ... SET f = f + n (recipes.counters),
+    поэтому save() ранее загруженного объекта их не записывает: иначе
+    устаревшие значения затёрли бы параллельные изменения.
+    """
+
+    counter_fields = ()
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and not kwargs.get('force_insert'):
+            update_fields = kwargs.get('update_fields')
+            if update_fields is None:
+                deferred = self.get_deferred_fields()
+                update_fields = [
+                    field.name for field in self._meta.concrete_fields
+                    if not field.primary_key
+                    and field.attname not in deferred]
+            kwargs['update_fields'] = [
+                name for name in update_fields
+                if name not in self.counter_fields]
+        super().save(*args, **kwargs)
+
+
+class User(CounterFieldsMixin, AbstractUser):
     """Модель пользователя."""
 
     username = models.CharField('username', max_length=150,
@@ -12,6 +37,12 @@ class User(AbstractUser):
     first_name = models.CharField('name', max_length=150)
     last_name = models.CharField('surname', max_length=150)
     email = models.EmailField('email', max_length=254, unique=True)
+    recipes_count = models.PositiveIntegerField(
+        'Количество рецептов', default=0, editable=False)
+    followers_count = models.PositiveIntegerField(
+        'Количество подписчиков', default=0, editable=False)
+
+    counter_fields = ('recipes_count', 'followers_count')
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ('id', 'username', 'first_name', 'last_name',)